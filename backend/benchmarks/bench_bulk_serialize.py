@@ -0,0 +1,94 @@
+"""
+Microbenchmark: serialización del cuerpo NDJSON de la Bulk API.
+
+Compara el bucle original (json.dumps de la acción y del documento por cada
+log + '\\n'.join de una lista de strings) con el camino del pipeline: líneas
+de DataFrame.to_json(lines=True) intercaladas con la acción por
+NDJSONBulkSerializer.add_ndjson, sin _id y con _id.
+
+Uso:
+    cd backend && python benchmarks/bench_bulk_serialize.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import elk_bulk  # noqa: E402
+
+DOCS = 50000
+BATCH = 5000
+INDEX = "f5xc-access-logs"
+
+def make_docs(n):
+    return [{
+        'Time': '2024-01-01T00:00:00.000Z',
+        'Request ID': f'req-{i}',
+        'Response Code': '200',
+        'Source IP address': f'10.0.{(i // 256) % 256}.{i % 256}',
+        'Domain': 'app.example.com',
+        'Country': 'ES',
+        'City': 'Madrid',
+        'Response Details': 'via_upstream',
+        'Method': 'GET',
+        'Request Path': f'/api/v1/items/{i}',
+        '@timestamp': '2024-01-01T00:00:00.000Z',
+        '_meta': {'tenant': 't', 'namespace': 'ns', 'loadbalancer': 'lb', 'log_type': 'access',
+                  'ingested_at': '2024-01-01T00:00:00Z'},
+    } for i in range(n)]
+
+def legacy(docs):
+    """Bucle original de send_to_elasticsearch_bulk"""
+    total = 0
+    for start in range(0, len(docs), BATCH):
+        bulk_lines = []
+        for log in docs[start:start + BATCH]:
+            action = {"index": {"_index": INDEX}}
+            bulk_lines.append(json.dumps(action))
+            bulk_lines.append(json.dumps(log))
+        total += len(('\n'.join(bulk_lines) + '\n').encode('utf-8'))
+    return total
+
+def serializer(docs, with_ids=False):
+    total = 0
+    ndjson = elk_bulk.NDJSONBulkSerializer(INDEX)
+    for start in range(0, len(docs), BATCH):
+        batch = docs[start:start + BATCH]
+        doc_lines = pd.DataFrame(batch).to_json(orient='records', lines=True, force_ascii=False).encode('utf-8')
+        ids = [f"{log['Request ID']}:{log['Time']}" for log in batch] if with_ids else None
+        ndjson.add_ndjson(doc_lines, len(batch), ids)
+        payload, _ = ndjson.take()
+        total += len(payload)
+    return total
+
+def serializer_ids(docs):
+    return serializer(docs, with_ids=True)
+
+def timed(fn, docs, rounds=3):
+    best = None
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        size = fn(docs)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+def main():
+    docs = make_docs(DOCS)
+    print(f"{DOCS} documentos, lotes de {BATCH}")
+
+    elapsed, size = timed(legacy, docs)
+    print(f"{'legacy (json.dumps x2 + join)':<40} {elapsed:.3f}s  {DOCS / elapsed:>10.0f} docs/s  {size / 1048576:.1f} MB")
+
+    elapsed, size = timed(serializer, docs)
+    print(f"{'to_json + add_ndjson':<40} {elapsed:.3f}s  {DOCS / elapsed:>10.0f} docs/s  {size / 1048576:.1f} MB")
+
+    elapsed, size = timed(serializer_ids, docs)
+    print(f"{'to_json + add_ndjson con _id':<40} {elapsed:.3f}s  {DOCS / elapsed:>10.0f} docs/s  {size / 1048576:.1f} MB")
+
+if __name__ == "__main__":
+    main()
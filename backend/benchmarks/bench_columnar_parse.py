@@ -0,0 +1,90 @@
+"""
+Benchmark: parseo de páginas de access logs fila a fila vs columnar.
+
+Compara el parser anterior (un dict de 10 claves por evento y pd.DataFrame
+sobre la lista de dicts) con el parser columnar (listas por columna y un
+único DataFrame con columnas category). Muestra tiempo y memoria del DataFrame.
+
+Uso:
+    cd backend && python benchmarks/bench_columnar_parse.py
+"""
+import json
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_fetchers  # noqa: E402
+
+PAGE_SIZE = 500
+COUNTRIES = ['ES', 'US', 'DE', 'FR', 'BR', 'MX', 'AR', 'CL']
+METHODS = ['GET', 'POST', 'PUT', 'DELETE']
+CODES = ['200', '301', '403', '404', '500']
+
+def make_pages(total):
+    rnd = random.Random(1)
+    events = [json.dumps({
+        'time': f'2024-01-01T00:{(i // 60) % 60:02d}:{i % 60:02d}.000Z',
+        'req_id': f'req-{i}',
+        'rsp_code': rnd.choice(CODES),
+        'src_ip': f'10.0.{(i // 256) % 256}.{i % 256}',
+        'original_authority': 'app.example.com',
+        'country': rnd.choice(COUNTRIES),
+        'city': 'Madrid',
+        'rsp_code_details': 'via_upstream',
+        'method': rnd.choice(METHODS),
+        'req_path': f'/path/{i % 1000}',
+    }) for i in range(total)]
+    return [events[start:start + PAGE_SIZE] for start in range(0, total, PAGE_SIZE)]
+
+def legacy_parse(pages):
+    """Parser anterior: dict por fila"""
+    logs_data = []
+    for logs in pages:
+        parsed_logs = [json.loads(event) for event in logs]
+        logs_data.extend([
+            {
+                'Time': log['time'],
+                'Request ID': log['req_id'],
+                'Response Code': log['rsp_code'],
+                'Source IP address': log['src_ip'],
+                'Domain': log['original_authority'],
+                'Country': log['country'],
+                'City': log['city'],
+                'Response Details': log['rsp_code_details'],
+                'Method': log['method'],
+                'Request Path': log['req_path']
+            }
+            for log in parsed_logs
+        ])
+    return pd.DataFrame(logs_data)
+
+def columnar_parse(pages):
+    columns = log_fetchers.new_columns("access")
+    for logs in pages:
+        log_fetchers._process_logs_batch(logs, columns)
+    return log_fetchers.columns_to_dataframe(columns)
+
+def timed(fn, pages):
+    t0 = time.perf_counter()
+    df = fn(pages)
+    return time.perf_counter() - t0, df
+
+def main():
+    print(f"{'eventos':>10} {'dicts (s)':>10} {'MB':>8} {'columnar (s)':>13} {'MB':>8}")
+    for total in (100000, 500000):
+        pages = make_pages(total)
+        legacy_s, legacy_df = timed(legacy_parse, pages)
+        columnar_s, columnar_df = timed(columnar_parse, pages)
+        assert len(columnar_df) == total
+        assert list(columnar_df['Request ID']) == list(legacy_df['Request ID'])
+        legacy_mb = legacy_df.memory_usage(deep=True).sum() / 1048576
+        columnar_mb = columnar_df.memory_usage(deep=True).sum() / 1048576
+        print(f"{total:>10} {legacy_s:>10.2f} {legacy_mb:>8.1f} {columnar_s:>13.2f} {columnar_mb:>8.1f}")
+
+if __name__ == "__main__":
+    main()
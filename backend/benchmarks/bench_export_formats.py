@@ -0,0 +1,81 @@
+"""
+Benchmark: tamaño y tiempo de recarga de las exportaciones por formato.
+
+Genera un DataFrame de access logs con el parser columnar, lo escribe en cada
+formato de export_formats y mide tamaño del archivo, tiempo de escritura y
+tiempo de recarga con pandas (lo que hacen los analistas), comparado con CSV.
+Los formatos cuya dependencia opcional no está instalada se omiten.
+
+Uso:
+    cd backend && python benchmarks/bench_export_formats.py
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import export_formats  # noqa: E402
+import log_fetchers  # noqa: E402
+
+PAGE_SIZE = 500
+COUNTRIES = ['ES', 'US', 'DE', 'FR', 'BR', 'MX', 'AR', 'CL']
+METHODS = ['GET', 'POST', 'PUT', 'DELETE']
+CODES = ['200', '301', '403', '404', '500']
+
+def make_dataframe(total):
+    rnd = random.Random(1)
+    columns = log_fetchers.new_columns("access")
+    for start in range(0, total, PAGE_SIZE):
+        events = [json.dumps({
+            'time': f'2024-01-01T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}.000Z',
+            'req_id': f'{rnd.getrandbits(64):016x}-{i}',
+            'rsp_code': rnd.choice(CODES),
+            'src_ip': f'10.0.{rnd.randrange(256)}.{rnd.randrange(256)}',
+            'original_authority': 'app.example.com',
+            'country': rnd.choice(COUNTRIES),
+            'city': 'Madrid',
+            'rsp_code_details': 'via_upstream',
+            'method': rnd.choice(METHODS),
+            'req_path': f'/api/v1/items/{rnd.randrange(5000)}?page={rnd.randrange(20)}',
+        }) for i in range(start, min(start + PAGE_SIZE, total))]
+        log_fetchers._process_logs_batch(events, columns)
+    return log_fetchers.columns_to_dataframe(columns)
+
+def main():
+    total = 500000
+    df = make_dataframe(total)
+    formats = export_formats.available_formats()
+    skipped = [fmt for fmt in export_formats.EXPORT_FORMATS if fmt not in formats]
+
+    print(f"{total} eventos de access logs")
+    print(f"{'formato':>11} {'MB':>8} {'vs csv':>7} {'escritura (s)':>14} {'recarga (s)':>12} {'vs csv':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for fmt in formats:
+            path = os.path.join(tmp, "export" + export_formats.file_extension(fmt))
+
+            t0 = time.perf_counter()
+            export_formats.write_dataframe(df, path, fmt)
+            write_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            reloaded = export_formats.read_dataframe(path)
+            read_s = time.perf_counter() - t0
+            assert len(reloaded) == total
+            assert list(reloaded['Request ID'][:5]) == list(df['Request ID'][:5])
+
+            size_mb = os.path.getsize(path) / 1048576
+            if baseline is None:
+                baseline = (size_mb, read_s)
+            print(f"{fmt:>11} {size_mb:>8.1f} {size_mb / baseline[0]:>6.2f}x {write_s:>14.2f} "
+                  f"{read_s:>12.2f} {read_s / baseline[1]:>6.2f}x")
+
+    if skipped:
+        print(f"Omitidos (falta la dependencia opcional): {', '.join(skipped)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: motor de scroll por ventanas contra una API de XC simulada.
+
+La API falsa genera eventos uniformes en el tiempo, responde páginas de
+PAGE_SIZE eventos y añade una latencia fija por petición. Compara el tiempo
+total de una descarga de 168h con distinto número de workers y verifica que
+el resultado queda en orden DESCENDING y sin pérdidas.
+
+Uso:
+    cd backend && python benchmarks/bench_scroll_engine.py
+"""
+import asyncio
+import bisect
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_fetchers  # noqa: E402
+
+PAGE_SIZE = 500
+LATENCY_SECONDS = 0.02
+EVENTS_PER_HOUR = 1500
+
+class FakeXCApi:
+    """Simula access_logs con scroll: un scroll_id codifica (start, end, offset)"""
+    def __init__(self, timestamps):
+        # Eventos ordenados de forma ascendente para buscar rangos con bisect
+        self._timestamps = sorted(timestamps)
+        self._events = [json.dumps({'time': ts, 'req_id': f'r{ts}', 'rsp_code': '200', 'src_ip': '10.0.0.1',
+                                    'original_authority': 'a', 'country': 'ES', 'city': 'M',
+                                    'rsp_code_details': 'via_upstream', 'method': 'GET', 'req_path': '/'})
+                        for ts in self._timestamps]
+
+    def _page(self, start, end, offset):
+        lo = bisect.bisect_left(self._timestamps, start)
+        hi = bisect.bisect_left(self._timestamps, end)
+        # DESCENDING: la página `offset` empieza por el evento más reciente de la ventana
+        top = hi - offset
+        bottom = max(lo, top - PAGE_SIZE)
+        events = self._events[bottom:top][::-1]
+        scroll_id = f'{start}:{end}:{offset + PAGE_SIZE}' if bottom > lo else ''
+        return {'logs': events, 'scroll_id': scroll_id}
+
+    async def handler(self, request):
+        await asyncio.sleep(LATENCY_SECONDS)
+        body = json.loads(request.content)
+        if request.url.path.endswith('/scroll'):
+            start, end, offset = (int(x) for x in body['scroll_id'].split(':'))
+        else:
+            start, end, offset = int(body['start_time']), int(body['end_time']), 0
+        return httpx.Response(200, json=self._page(start, end, offset))
+
+    def client(self):
+        return httpx.AsyncClient(base_url='https://tenant.console.ves.volterra.io',
+                                 transport=httpx.MockTransport(self.handler))
+
+def main():
+    hours = 168
+    start_time, end_time = log_fetchers._time_window(hours)
+    step = 3600 / EVENTS_PER_HOUR
+    timestamps = [int(end_time - 1 - i * step) for i in range(int(hours * EVENTS_PER_HOUR))]
+    timestamps = [ts for ts in timestamps if ts >= start_time]
+
+    api = FakeXCApi(timestamps)
+
+    print(f"{len(timestamps)} eventos en {hours}h, latencia {LATENCY_SECONDS * 1000:.0f}ms por petición")
+    for workers in (1, 4, 8):
+        t0 = time.perf_counter()
+        rows = asyncio.run(log_fetchers.scroll_time_slices(api.client(), 'ns', 'access', None, start_time, end_time,
+                                                           log_fetchers._process_logs_batch, workers, "BENCH"))
+        elapsed = time.perf_counter() - t0
+        times = rows['Time']
+        assert len(times) == len(timestamps), (len(times), len(timestamps))
+        assert times == sorted(times, reverse=True)
+        print(f"workers={workers}: {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
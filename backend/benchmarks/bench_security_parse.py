@@ -0,0 +1,119 @@
+"""
+Benchmark: parseo de security events con páginas sintéticas.
+
+Compara el bucle original (un DataFrame de una fila + pd.concat por evento)
+con fetch_security_logs, que procesa páginas completas. Con el bucle original
+el tiempo por evento crece con el tamaño; con el nuevo se mantiene constante.
+
+Uso:
+    cd backend && python benchmarks/bench_security_parse.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_clients  # noqa: E402
+import log_fetchers  # noqa: E402
+
+PAGE_SIZE = 500
+
+def make_event(i):
+    return json.dumps({
+        'time': f'2024-01-01T00:{(i // 60) % 60:02d}:{i % 60:02d}.000Z',
+        'req_id': f'req-{i}',
+        'sec_event_name': 'WAF',
+        'src_ip': f'10.0.{(i // 256) % 256}.{i % 256}',
+        'x_forwarded_for': '',
+        'country': 'ES',
+        'city': 'Madrid',
+        'browser_type': 'Chrome',
+        'domain': 'app.example.com',
+        'method': 'GET',
+        'req_path': f'/path/{i}',
+        'rsp_code': '403',
+    })
+
+def make_pages(total):
+    events = [make_event(i) for i in range(total)]
+    pages = []
+    for start in range(0, total, PAGE_SIZE):
+        last = start + PAGE_SIZE >= total
+        pages.append({'events': events[start:start + PAGE_SIZE], 'scroll_id': '' if last else f'scroll-{start}'})
+    return pages
+
+class FakeXCApi:
+    """
+    API de XC simulada (httpx.MockTransport) que devuelve las páginas sintéticas
+    en orden. Todas las páginas pertenecen a la primera ventana de tiempo; el
+    resto de ventanas están vacías.
+    """
+    def __init__(self, pages):
+        self._pages = iter(pages)
+        self._first = True
+
+    def handler(self, request):
+        if request.url.path.endswith('/scroll') or self._first:
+            self._first = False
+            return httpx.Response(200, json=next(self._pages))
+        return httpx.Response(200, json={'events': [], 'scroll_id': ''})
+
+    def client(self):
+        return httpx.AsyncClient(base_url='https://tenant.console.ves.volterra.io',
+                                 transport=httpx.MockTransport(self.handler))
+
+def legacy_parse(pages):
+    """Bucle original de get_securiy_logs (pd.concat por evento)"""
+    df = pd.DataFrame(columns=log_fetchers.SECURITY_COLUMNS)
+    for page in pages:
+        for event in page['events']:
+            item_dict = json.loads(event)
+            tmp = {'Time': item_dict['time'], 'Request ID': item_dict['req_id'], 'Event Type': item_dict['sec_event_name'],
+                   'Source IP address': item_dict['src_ip'], 'X-Forwarded-For': item_dict['x_forwarded_for'],
+                   'Country': item_dict['country'], 'City': item_dict['city'], 'Browser': item_dict['browser_type'],
+                   'Domain': item_dict['domain'], 'Method': item_dict['method'], 'Request Path': item_dict['req_path'],
+                   'Response Code': item_dict['rsp_code']}
+            df = pd.concat([df, pd.DataFrame([tmp])], ignore_index=True)
+    return df
+
+def batched_parse(pages):
+    """fetch_security_logs contra la API simulada"""
+    api = FakeXCApi(pages)
+    # fetch_security_logs toma el cliente con http_clients.xc_client_lease
+    original = http_clients.get_xc_client
+    http_clients.get_xc_client = lambda tenant, token: api.client()
+    try:
+        # Sin caché horaria: cada tamaño debe parsear todas sus páginas
+        return asyncio.run(log_fetchers.fetch_security_logs('token', 'tenant', 'ns', 'lb', 24, use_cache=False))
+    finally:
+        http_clients.get_xc_client = original
+
+def timed(fn, pages):
+    t0 = time.perf_counter()
+    df = fn(pages)
+    return time.perf_counter() - t0, len(df)
+
+def main():
+    print(f"{'eventos':>10} {'legacy (s)':>12} {'us/evento':>10} {'batch (s)':>12} {'us/evento':>10}")
+    for total in (1000, 2000, 4000, 8000):
+        pages = make_pages(total)
+        legacy_s, _ = timed(legacy_parse, pages)
+        batch_s, rows = timed(batched_parse, pages)
+        assert rows == total
+        print(f"{total:>10} {legacy_s:>12.3f} {legacy_s / total * 1e6:>10.1f} {batch_s:>12.3f} {batch_s / total * 1e6:>10.1f}")
+
+    # El camino nuevo escala linealmente hasta tamaños que el bucle original no puede abordar
+    for total in (50000, 100000, 200000):
+        pages = make_pages(total)
+        batch_s, rows = timed(batched_parse, pages)
+        assert rows == total
+        print(f"{total:>10} {'-':>12} {'-':>10} {batch_s:>12.3f} {batch_s / total * 1e6:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: lectura del token de un tenant en la base SQLite.
+
+Compara abrir una conexión por consulta (comportamiento anterior), tomarla del
+pool de db_pool (WAL + sentencias preparadas en caché) y la caché en memoria de
+tokens, con varios hilos leyendo a la vez como hacen las peticiones del backend.
+
+Uso:
+    cd backend && python benchmarks/bench_sqlite_pool.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_pool import SQLitePool  # noqa: E402
+
+TENANTS = 50
+LOOKUPS = 20000
+THREADS = 8
+QUERY = "SELECT token FROM tenants WHERE tenant = ?"
+
+def setup(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE tenants (tenant TEXT PRIMARY KEY, token TEXT NOT NULL)")
+    conn.executemany("INSERT INTO tenants VALUES (?, ?)",
+                     [(f"tenant-{i}", f"token-{i:032d}") for i in range(TENANTS)])
+    conn.commit()
+    conn.close()
+
+def run(label, lookup):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(lookup, (f"tenant-{i % TENANTS}" for i in range(LOOKUPS))))
+    elapsed = time.perf_counter() - t0
+    print(f"{label:>22} {elapsed:>8.2f}s {LOOKUPS / elapsed:>12.0f} consultas/s")
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tenants.db")
+        setup(path)
+
+        def connect_per_call(tenant):
+            conn = sqlite3.connect(path)
+            try:
+                return conn.execute(QUERY, (tenant,)).fetchone()[0]
+            finally:
+                conn.close()
+
+        db_pool = SQLitePool(path)
+
+        def pooled(tenant):
+            with db_pool.connection() as conn:
+                return conn.execute(QUERY, (tenant,)).fetchone()[0]
+
+        cache = {}
+
+        def cached(tenant):
+            token = cache.get(tenant)
+            if token is None:
+                token = cache[tenant] = pooled(tenant)
+            return token
+
+        print(f"{LOOKUPS} lecturas de token con {THREADS} hilos")
+        run("conexión por consulta", connect_per_call)
+        run("pool", pooled)
+        run("pool + caché", cached)
+        db_pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# db_pool.py
+"""
+Pool de conexiones SQLite reutilizables entre peticiones.
+
+Cada conexión se abre una sola vez en modo WAL (lecturas concurrentes con una
+escritura) y conserva su caché de sentencias preparadas de sqlite3, así que las
+consultas frecuentes no vuelven a abrir el archivo ni a compilar el SQL. Las
+conexiones se comparten entre hilos (check_same_thread=False), pero cada una
+la usa un solo hilo a la vez: quien la toma del pool la devuelve al terminar.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+DB_POOL_SIZE = 8                 # Conexiones abiertas como máximo
+DB_BUSY_TIMEOUT_SECONDS = 10     # Espera ante bloqueos de escritura
+DB_ACQUIRE_TIMEOUT_SECONDS = 30  # Espera por una conexión libre
+
+class SQLitePool:
+    """Pool acotado de conexiones sqlite3 (LIFO: se reutilizan las más recientes)"""
+
+    def __init__(self, path: str, size: int = DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=DB_ACQUIRE_TIMEOUT_SECONDS)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Toma una conexión del pool; al salir deshace lo no confirmado y la devuelve"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                conn.close()
+                with self._lock:
+                    self._created -= 1
+            else:
+                self._idle.put(conn)
+
+    def close(self):
+        """Cierra las conexiones libres (al apagar la aplicación)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
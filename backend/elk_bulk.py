@@ -0,0 +1,349 @@
+# elk_bulk.py
+"""
+Envío concurrente a la Bulk API de Elasticsearch.
+
+BulkIndexer acumula documentos serializados hasta un objetivo de bytes por lote
+y mantiene hasta `max_in_flight` peticiones Bulk en vuelo sobre el cliente
+compartido (keep-alive). Si el cluster responde 429 el envío se frena con un
+retardo adaptativo, y los reintentos reenvían solo los items que fallaron.
+
+El cuerpo NDJSON se escribe en un buffer de bytes con la línea de acción
+precalculada. Los documentos llegan ya serializados (DataFrame.to_json, ver
+main.dataframe_to_ndjson): aquí solo se serializan los `_id` de las acciones.
+
+Con `op_type` "create" o "index" cada documento lleva un `_id` estable, de modo
+que reenviar los mismos eventos no crea duplicados: con "create" los que ya
+existen se rechazan con 409 y se cuentan como `duplicates`, con "index" se
+sobrescriben.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence
+import httpx
+
+from metrics import (ELK_BULK_BYTES, ELK_BULK_DOCUMENTS, ELK_BULK_ITEM_ERRORS, ELK_BULK_REQUEST_ERRORS,
+                     ELK_BULK_SECONDS)
+
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_TARGET_BYTES = 8 * 1024 * 1024   # ~8 MB por petición Bulk
+MAX_DOCS_PER_BATCH = 20000
+MAX_RETRIES = 3
+
+# Modos de _id: sin _id (autogenerado por Elasticsearch) o con _id estable
+ID_MODES = ("none", "create", "index")
+
+# Estados por item (o de la petición completa) que se pueden reintentar
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+# Retardo adaptativo entre lotes cuando el cluster pide frenar (429)
+THROTTLE_MIN_DELAY = 0.25
+THROTTLE_MAX_DELAY = 30.0
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+def dumps_bytes(value: Any) -> bytes:
+    """JSON compacto en UTF-8 (los _id de las líneas de acción)"""
+    return _json_encoder.encode(value).encode('utf-8')
+
+class NDJSONBulkSerializer:
+    """
+    Serializa documentos al formato NDJSON de la Bulk API en un buffer reutilizable.
+
+    La línea de acción (`op_type`: "index" o "create") se calcula una sola vez
+    por índice, con o sin _id. Cada item ocupa
+    exactamente dos líneas (acción + documento), lo que permite reenviar solo
+    los que fallen con select_items.
+    """
+
+    def __init__(self, index_name: str, op_type: str = "index"):
+        self.action_line = json.dumps({op_type: {"_index": index_name}}).encode('utf-8') + b'\n'
+        # Línea de acción con _id: prefijo + _id serializado + sufijo
+        self._id_prefix = json.dumps({op_type: {"_index": index_name}})[:-2].encode('utf-8') + b',"_id":'
+        self._id_suffix = b'}}\n'
+        self._buffer = bytearray()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer)
+
+    def action_size(self, doc_id: Optional[str] = None) -> int:
+        """Bytes de la línea de acción de un documento (con _id, en UTF-8)"""
+        if doc_id is None:
+            return len(self.action_line)
+        return len(self._id_prefix) + len(dumps_bytes(doc_id)) + len(self._id_suffix)
+
+    def add_ndjson(self, doc_lines: bytes, count: int, ids: Optional[Sequence[str]] = None):
+        """
+        Agrega documentos ya serializados (una línea JSON por documento, p. ej.
+        de DataFrame.to_json(lines=True)) intercalando la línea de acción.
+        Si se indican `ids` (uno por documento, en orden) cada acción lleva su _id.
+        """
+        if not count:
+            return
+        if doc_lines.endswith(b'\n'):
+            doc_lines = doc_lines[:-1]
+        buffer = self._buffer
+        if ids is None:
+            buffer += self.action_line
+            buffer += doc_lines.replace(b'\n', b'\n' + self.action_line)
+        else:
+            prefix, suffix = self._id_prefix, self._id_suffix
+            buffer += b'\n'.join([
+                prefix + dumps_bytes(doc_id) + suffix + line
+                for doc_id, line in zip(ids, doc_lines.split(b'\n'))
+            ])
+        buffer += b'\n'
+        self._count += count
+
+    def take(self):
+        """Retorna (payload, items) del lote actual y vacía el buffer"""
+        payload = bytes(self._buffer)
+        count = self._count
+        self._buffer.clear()
+        self._count = 0
+        return payload, count
+
+def select_items(payload: bytes, indexes: List[int]) -> bytes:
+    """Construye un nuevo payload solo con los items indicados (por posición)"""
+    lines = payload.split(b'\n')
+    selected = bytearray()
+    for i in indexes:
+        selected += lines[2 * i]
+        selected += b'\n'
+        selected += lines[2 * i + 1]
+        selected += b'\n'
+    return bytes(selected)
+
+class BulkIndexer:
+    """
+    Indexador Bulk con lotes por tamaño en bytes y peticiones concurrentes.
+
+    Uso:
+        indexer = BulkIndexer(client, bulk_url, headers, auth, index_name)
+        await indexer.add_ndjson(doc_lines, count, ids)
+        stats = await indexer.close()
+
+    `op_type` ("index" o "create") solo aplica a los documentos que se agregan con _id.
+    Si se indica `progress` (dict) se actualizan en él `documents_indexed` y
+    `batches_acked` cada vez que Elasticsearch responde un lote.
+    `tenant` y `log_type` solo se usan como etiquetas de las métricas (junto al índice).
+    """
+
+    def __init__(self, client: httpx.AsyncClient, bulk_url: str, headers: Dict[str, str], auth, index_name: str,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, target_bytes: int = DEFAULT_TARGET_BYTES,
+                 max_retries: int = MAX_RETRIES, op_type: str = "index", progress: Optional[Dict[str, Any]] = None,
+                 tenant: str = "", log_type: str = ""):
+        self.client = client
+        self.bulk_url = bulk_url
+        self.headers = headers
+        self.auth = auth
+        self.index_name = index_name
+        self.target_bytes = target_bytes
+        self.max_retries = max_retries
+        self.progress = progress
+        self._labels = {"tenant": tenant, "log_type": log_type, "index": index_name}
+
+        self._serializer = NDJSONBulkSerializer(index_name, op_type)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks = set()
+        self._delay = 0.0
+        self._batch_num = 0
+        self._started_at: Optional[float] = None
+
+        self.stats = {
+            "documents_sent": 0,
+            "errors": 0,
+            "duplicates": 0,
+            "took_ms": 0,
+            "bytes_sent": 0,
+            "batches": 0,
+            "retries": 0,
+            "throttled": 0,
+        }
+
+    async def add_ndjson(self, doc_lines: bytes, count: int, ids: Optional[Sequence[str]] = None):
+        """
+        Agrega `count` documentos ya serializados como NDJSON (con @timestamp).
+        El bloque se reparte entre lotes para no pasar de `target_bytes` ni de
+        MAX_DOCS_PER_BATCH por petición (un documento más grande que el
+        objetivo va solo en su lote).
+        """
+        if self._started_at is None:
+            self._started_at = time.time()
+        if not count:
+            return
+
+        serializer = self._serializer
+        lines = doc_lines.rstrip(b'\n').split(b'\n')
+        start = 0
+        while start < count:
+            room_docs = MAX_DOCS_PER_BATCH - len(serializer)
+            room_bytes = self.target_bytes - serializer.nbytes
+            end, size = start, 0
+            while end < count and end - start < room_docs:
+                item_size = len(lines[end]) + 1 + serializer.action_size(ids[end] if ids is not None else None)
+                if size + item_size > room_bytes and (end > start or len(serializer)):
+                    break
+                size += item_size
+                end += 1
+
+            if end > start:
+                serializer.add_ndjson(b'\n'.join(lines[start:end]), end - start,
+                                      ids[start:end] if ids is not None else None)
+                start = end
+            if start < count or serializer.nbytes >= self.target_bytes or len(serializer) >= MAX_DOCS_PER_BATCH:
+                await self._dispatch()
+
+    async def close(self) -> Dict[str, Any]:
+        """Envía lo pendiente, espera los lotes en vuelo y retorna las estadísticas"""
+        if len(self._serializer):
+            await self._dispatch()
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+        elapsed = time.time() - self._started_at if self._started_at else 0.0
+        self.stats["elapsed_seconds"] = round(elapsed, 2)
+        self.stats["docs_per_second"] = round(self.stats["documents_sent"] / elapsed, 1) if elapsed > 0 else 0.0
+        self.stats["mb_per_second"] = round(self.stats["bytes_sent"] / 1048576 / elapsed, 2) if elapsed > 0 else 0.0
+        return self.stats
+
+    async def abort(self):
+        """Cancela los lotes en vuelo y espera a que terminen (si la exportación falla o se cancela)"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _dispatch(self):
+        """Saca el lote actual y lo envía en segundo plano (espera si no hay hueco en vuelo)"""
+        payload, count = self._serializer.take()
+        self._batch_num += 1
+
+        await self._slots.acquire()
+        task = asyncio.create_task(self._send(payload, count, self._batch_num))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, payload: bytes, count: int, batch_num: int):
+        try:
+            await self._send_with_retries(payload, count, batch_num)
+        except Exception as e:
+            print(f"[ELK] Lote #{batch_num} error: {str(e)}")
+            self._count_errors(count)
+        finally:
+            self._slots.release()
+
+    async def _send_with_retries(self, payload: bytes, count: int, batch_num: int):
+        attempt = 0
+        while count:
+            if self._delay > 0:
+                await asyncio.sleep(self._delay)
+
+            t0 = time.perf_counter()
+            try:
+                response = await self.client.post(
+                    self.bulk_url,
+                    content=payload,
+                    headers=self.headers,
+                    auth=self.auth
+                )
+            except httpx.TransportError as e:
+                ELK_BULK_REQUEST_ERRORS.labels(**self._labels, status="connection").inc()
+                if attempt >= self.max_retries:
+                    print(f"[ELK] Lote #{batch_num} error de conexión: {str(e)}")
+                    self._count_errors(count)
+                    return
+                attempt += 1
+                self.stats["retries"] += 1
+                await asyncio.sleep(min(THROTTLE_MAX_DELAY, THROTTLE_MIN_DELAY * 2 ** attempt))
+                continue
+
+            ELK_BULK_SECONDS.labels(**self._labels).observe(time.perf_counter() - t0)
+            ELK_BULK_BYTES.labels(**self._labels).observe(len(payload))
+            self.stats["bytes_sent"] += len(payload)
+            self.stats["batches"] += 1
+
+            if response.status_code not in [200, 201]:
+                ELK_BULK_REQUEST_ERRORS.labels(**self._labels, status=response.status_code).inc()
+
+            if response.status_code in RETRYABLE_STATUS:
+                if response.status_code == 429:
+                    self._throttle()
+                if attempt >= self.max_retries:
+                    print(f"[ELK] ❌ Lote #{batch_num} falló: HTTP {response.status_code}")
+                    self._count_errors(count)
+                    return
+                attempt += 1
+                self.stats["retries"] += 1
+                if response.status_code != 429:
+                    # 502/503/504: el cluster o el proxy no está disponible, esperar como en los errores de conexión
+                    await asyncio.sleep(min(THROTTLE_MAX_DELAY, THROTTLE_MIN_DELAY * 2 ** attempt))
+                continue
+
+            if response.status_code not in [200, 201]:
+                print(f"[ELK] ❌ Lote #{batch_num} falló: HTTP {response.status_code}")
+                self._count_errors(count)
+                return
+
+            result = response.json()
+            self.stats["took_ms"] += result.get('took', 0)
+
+            # Separar items correctos, duplicados (create con _id existente), fallidos y reintentables
+            retry_items = []
+            batch_errors = 0
+            batch_duplicates = 0
+            if result.get('errors', False):
+                for i, item in enumerate(result.get('items', [])):
+                    outcome = next(iter(item.values()), {})
+                    if 'error' not in outcome:
+                        continue
+                    ELK_BULK_ITEM_ERRORS.labels(**self._labels, status=outcome.get('status')).inc()
+                    if outcome.get('status') == 409:
+                        batch_duplicates += 1
+                    elif outcome.get('status') in RETRYABLE_STATUS and attempt < self.max_retries:
+                        retry_items.append(i)
+                    else:
+                        batch_errors += 1
+
+            batch_sent = count - len(retry_items) - batch_errors - batch_duplicates
+            self.stats["documents_sent"] += batch_sent
+            self._count_errors(batch_errors)
+            self.stats["duplicates"] += batch_duplicates
+            ELK_BULK_DOCUMENTS.labels(**self._labels, result="indexed").inc(batch_sent)
+            if batch_duplicates:
+                ELK_BULK_DOCUMENTS.labels(**self._labels, result="duplicate").inc(batch_duplicates)
+            if self.progress is not None:
+                self.progress["documents_indexed"] = self.stats["documents_sent"]
+                self.progress["batches_acked"] = self.progress.get("batches_acked", 0) + 1
+            print(f"[ELK] Lote #{batch_num}: {batch_sent} enviados, {batch_errors} errores"
+                  + (f", {batch_duplicates} duplicados" if batch_duplicates else "")
+                  + (f", {len(retry_items)} a reintentar" if retry_items else ""))
+
+            if retry_items:
+                self._throttle()
+                attempt += 1
+                self.stats["retries"] += 1
+                payload = select_items(payload, retry_items)
+            else:
+                self._relax()
+            count = len(retry_items)
+
+    def _count_errors(self, count: int):
+        self.stats["errors"] += count
+        if count:
+            ELK_BULK_DOCUMENTS.labels(**self._labels, result="error").inc(count)
+
+    def _throttle(self):
+        """El cluster pide frenar: duplicar el retardo entre envíos"""
+        self.stats["throttled"] += 1
+        self._delay = min(THROTTLE_MAX_DELAY, max(THROTTLE_MIN_DELAY, self._delay * 2))
+
+    def _relax(self):
+        """Lote aceptado: reducir el retardo gradualmente"""
+        self._delay = self._delay / 2 if self._delay > THROTTLE_MIN_DELAY else 0.0
@@ -0,0 +1,94 @@
+# export_formats.py
+"""
+Formatos de archivo para las exportaciones de logs.
+
+Además del CSV original se puede exportar como CSV comprimido, Parquet o NDJSON
+comprimido (gzip o zstd). Parquet es el más rápido de recargar en pandas: guarda
+los tipos de columna y codifica con diccionario las columnas de pocos valores
+(las categóricas de log_fetchers.CATEGORICAL_COLUMNS se recargan como tales).
+
+Parquet requiere pyarrow y NDJSON zstd requiere zstandard; ambos son opcionales.
+"""
+import importlib.util
+import os
+from typing import List
+
+import pandas as pd
+
+DEFAULT_FORMAT = "csv"
+
+# formato -> (extensión, media type)
+EXPORT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "ndjson.gz": (".ndjson.gz", "application/gzip"),
+    "ndjson.zst": (".ndjson.zst", "application/zstd"),
+}
+
+# Módulo opcional que necesita cada formato
+REQUIRED_MODULES = {
+    "parquet": "pyarrow",
+    "ndjson.zst": "zstandard",
+}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+PARQUET_COMPRESSION = "zstd"
+
+def missing_module(fmt: str) -> str:
+    """Nombre del módulo opcional que falta para `fmt` ('' si está disponible)"""
+    module = REQUIRED_MODULES.get(fmt)
+    if module and importlib.util.find_spec(module) is None:
+        return module
+    return ''
+
+def available_formats() -> List[str]:
+    return [fmt for fmt in EXPORT_FORMATS if not missing_module(fmt)]
+
+def check_format(fmt: str):
+    """ValueError si el formato no existe o falta su dependencia"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato inválido. Valores permitidos: {list(EXPORT_FORMATS)}")
+    module = missing_module(fmt)
+    if module:
+        raise ValueError(f"El formato '{fmt}' requiere instalar {module} (pip install {module})")
+
+def file_extension(fmt: str) -> str:
+    return EXPORT_FORMATS[fmt][0]
+
+def media_type_for(filename: str) -> str:
+    """Media type según la extensión del archivo (text/csv si no se reconoce)"""
+    for extension, media_type in sorted(EXPORT_FORMATS.values(), key=lambda item: -len(item[0])):
+        if filename.endswith(extension):
+            return media_type
+    return "text/csv"
+
+def write_dataframe(df: pd.DataFrame, path: str, fmt: str = DEFAULT_FORMAT):
+    """Escribe el DataFrame en `path` con el formato indicado (bloqueante)"""
+    check_format(fmt)
+    if fmt == "csv":
+        df.to_csv(path, index=False, encoding='utf-8')
+    elif fmt == "csv.gz":
+        df.to_csv(path, index=False, encoding='utf-8',
+                  compression={"method": "gzip", "compresslevel": GZIP_LEVEL})
+    elif fmt == "parquet":
+        # Las columnas categóricas se guardan como diccionario de Arrow y el
+        # resto usa codificación por diccionario de Parquet en cada página
+        df.to_parquet(path, engine="pyarrow", index=False, compression=PARQUET_COMPRESSION,
+                      use_dictionary=True)
+    elif fmt == "ndjson.gz":
+        df.to_json(path, orient="records", lines=True, force_ascii=False,
+                   compression={"method": "gzip", "compresslevel": GZIP_LEVEL})
+    elif fmt == "ndjson.zst":
+        df.to_json(path, orient="records", lines=True, force_ascii=False,
+                   compression={"method": "zstd", "level": ZSTD_LEVEL})
+
+def read_dataframe(path: str) -> pd.DataFrame:
+    """Recarga una exportación según su extensión"""
+    name = os.path.basename(path)
+    if name.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if name.endswith((".ndjson.gz", ".ndjson.zst")):
+        return pd.read_json(path, lines=True, dtype=False)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
@@ -1,64 +1,48 @@
 from datetime import datetime
 import argparse
-import json
-import requests
-import pandas as pd 
-
-def get_securiy_logs(token,tenant,namespace,loadbalancer,hours):
-
-    df = pd.DataFrame(columns = ['Time', 'Request ID', 'Event Type', 'Source IP address', 'X-Forwarded-For' ,'Country', 'City', 'Browser', 'Domain','Method', 'Request Path', 'Response Code'])
-
-    currentTime = datetime.now()
-    midTime = int(round(datetime.timestamp(currentTime)))
-    startTime = midTime - (hours*3600)
-
-    while True:
-        endTime = midTime
-        midTime= endTime - (24*3600)
-        if hours < 24:
-            midTime=startTime
-        BASE_URL = 'https://{}.console.ves.volterra.io/api/data/namespaces/{}/app_security/events'.format(tenant,namespace)
-        headers = {'Authorization': "APIToken {}".format(token)}
-        auth_response = requests.post(BASE_URL, data=json.dumps({"aggs": {}, "end_time": "{}".format(endTime), "limit": 0, "namespace": "{}".format(namespace), "query": "{{vh_name=\"ves-io-http-loadbalancer-""{}""\"}}".format(loadbalancer), "sort": "DESCENDING", "start_time": "{}".format(midTime), "scroll":True } ), headers=headers)
-        securityLogs = auth_response.json()
-        events = securityLogs['events']
-        if 'events' in securityLogs:
-            
-            for event in events:
-                item_dict = json.loads(event)
-                tmp = {'Time':item_dict['time'], 'Request ID':item_dict['req_id'], 'Event Type':item_dict['sec_event_name'], 'Source IP address':item_dict['src_ip'],'X-Forwarded-For':item_dict['x_forwarded_for'], 'Country':item_dict['country'], 'City':item_dict['city'], 'Browser':item_dict['browser_type'], 'Domain':item_dict['domain'],'Method':item_dict['method'], 'Request Path':item_dict['req_path'], 'Response Code':item_dict['rsp_code']}   
-                df_dictionary = pd.DataFrame([tmp])
-                df = pd.concat([df, df_dictionary], ignore_index=True)
-            while (securityLogs["scroll_id"]!=""):
-                BASE_URL = 'https://{}.console.ves.volterra.io/api/data/namespaces/{}/app_security/events/scroll'.format(tenant,namespace)
-                auth_response = requests.post(BASE_URL, data=json.dumps({"namespace": "{}".format(namespace), "scroll_id": "{}".format(securityLogs["scroll_id"]),"scroll":True}), headers=headers)
-                securityLogs = auth_response.json()
-                events = securityLogs['events']
-                for event in events:
-                    item_dict = json.loads(event)
-                    tmp = {'Time':item_dict['time'], 'Request ID':item_dict['req_id'], 'Event Type':item_dict['sec_event_name'], 'Source IP address':item_dict['src_ip'],'X-Forwarded-For':item_dict['x_forwarded_for'], 'Country':item_dict['country'], 'City':item_dict['city'], 'Browser':item_dict['browser_type'], 'Domain':item_dict['domain'],'Method':item_dict['method'], 'Request Path':item_dict['req_path'], 'Response Code':item_dict['rsp_code']}   
-                    df_dictionary = pd.DataFrame([tmp])
-                    df = pd.concat([df, df_dictionary], ignore_index=True)
-        hours=hours-24
-        if hours<24:
-            break
-        
-    return df
-
+import asyncio
+from http_clients import close_clients
+from log_cache import set_log_cache_dir
+from log_fetchers import fetch_security_logs, DEFAULT_MAX_WORKERS
+from export_formats import DEFAULT_FORMAT, EXPORT_FORMATS, file_extension, write_dataframe
+
+async def get_security_logs(token, tenant, namespace, loadbalancer, hours, max_workers=DEFAULT_MAX_WORKERS, cache_dir=None):
+    """
+    Descarga los security events con log_fetchers (mismo código que usa el
+    backend) y cierra el pool de conexiones al terminar. Avisa si XC reportó
+    más eventos de los recibidos.
+    Solo usa la caché horaria en disco si se indica `cache_dir`.
+    """
+    if cache_dir:
+        set_log_cache_dir(cache_dir)
+    progress = {}
+    try:
+        logs = await fetch_security_logs(token, tenant, namespace, loadbalancer, hours, max_workers, progress, use_cache=bool(cache_dir))
+    finally:
+        await close_clients()
+
+    if progress.get("truncated_events"):
+        print(f"[WARN] XC reportó {progress['truncated_events']} eventos más de los recibidos: el archivo está incompleto")
+    return logs
 
 def main():
     currentTime = datetime.now()
-    parser = argparse.ArgumentParser(description = "This *Python* script helps to export the Security Events logs from *F5 Distributed Cloud* via the XC API into a CSV file.", epilog='The script generates a CSV file named as: xc-security_events-<TENANT>_<NAMESPACE>-<date>.csv')    
+    parser = argparse.ArgumentParser(description = "This *Python* script helps to export the Security Events logs from *F5 Distributed Cloud* via the XC API into a CSV file.", epilog='The script generates a CSV file named as: f5-xc-security_events-<TENANT>_<NAMESPACE>-<date>.csv (or .csv.gz, .parquet, .ndjson.gz, .ndjson.zst with --format)')
     parser.add_argument('--token', type=str, required=True)
     parser.add_argument('--tenant', type=str, required=True)
     parser.add_argument('--namespace', type=str, required=True)
     parser.add_argument('--loadbalancer', type=str, required=True)
     parser.add_argument('--hours', type=int, required=True)
+    parser.add_argument('--format', type=str, choices=list(EXPORT_FORMATS), default=DEFAULT_FORMAT)
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument('--cache-dir', type=str, default=None, help='Directory for the hourly log cache (default: no cache)')
     args = parser.parse_args()
 
-    security_logs = get_securiy_logs(args.token,args.tenant,args.namespace,args.loadbalancer,args.hours)
-    security_logs.to_csv("f5-xc-security_events-{}_{}-{}.csv".format(args.tenant,args.namespace,currentTime.strftime("%m-%d-%Y")), index = False, sep=',', encoding='utf-8')
+    security_logs = asyncio.run(get_security_logs(args.token, args.tenant, args.namespace, args.loadbalancer, args.hours, args.workers, args.cache_dir))
+    filename = "f5-xc-security_events-{}_{}-{}{}".format(args.tenant,args.namespace,currentTime.strftime("%m-%d-%Y"),file_extension(args.format))
+    write_dataframe(security_logs, filename, args.format)
+    print(f"[INFO] Saved to: {filename} ({len(security_logs)} events)")
 
 
 if __name__ == "__main__":
-   main()
\ No newline at end of file
+   main()
@@ -0,0 +1,169 @@
+# health.py
+"""
+Comprobación periódica de las dependencias (Elasticsearch y la API de XC).
+
+Un HealthChecker corre en segundo plano y cada `interval` segundos lanza a la
+vez una sonda por dependencia (con `timeout`), guardando el estado, la hora de
+la comprobación y las últimas latencias. /api/health responde con esa foto sin
+esperar a nadie, así los health checks de los balanceadores no se acumulan
+cuando ELK o XC no responden.
+
+Cada sonda puede tener su propio intervalo, más largo que el del bucle: la API
+de XC de cada tenant consume cuota del cliente, así que se comprueba cada
+HEALTH_CHECK_SLOW_INTERVAL_SECONDS (o al pedirlo con request_check).
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import httpx
+
+HEALTH_CHECK_INTERVAL_SECONDS = 30
+HEALTH_CHECK_TIMEOUT_SECONDS = 5
+HEALTH_CHECK_SLOW_INTERVAL_SECONDS = 15 * 60  # Dependencias con cuota (API de XC de cada tenant)
+HEALTH_LATENCY_SAMPLES = 120           # Latencias que se conservan por dependencia (1h con el intervalo por defecto)
+
+Probe = Callable[[], Awaitable[httpx.Response]]
+# Dependencia -> (sonda, datos que se muestran junto al estado (p. ej. la URL),
+#                 intervalo propio en segundos o None para el del bucle)
+Probes = Dict[str, Tuple[Probe, Dict[str, Any], Optional[float]]]
+ProbeFactory = Callable[[], Probes]
+
+def _iso(epoch: Optional[float]) -> Optional[str]:
+    return datetime.utcfromtimestamp(epoch).isoformat() + 'Z' if epoch else None
+
+def percentile(samples, pct: float) -> Optional[float]:
+    """Percentil por rango más cercano (None sin muestras)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return round(ordered[index], 1)
+
+class HealthChecker:
+    """Estado de las dependencias, refrescado en segundo plano"""
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL_SECONDS,
+                 timeout: float = HEALTH_CHECK_TIMEOUT_SECONDS):
+        self.interval = interval
+        self.timeout = timeout
+        self.last_check: Optional[float] = None
+        self._targets: Dict[str, Dict[str, Any]] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, probes: ProbeFactory):
+        """Arranca el bucle de comprobaciones (`probes` se consulta en cada vuelta, en un hilo)"""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(probes))
+
+    def request_check(self):
+        """
+        Adelanta la próxima comprobación de todas las sondas, también las de
+        intervalo largo (p. ej. al cambiar la configuración); seguro desde otros hilos
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, probes: ProbeFactory):
+        force = True
+        while True:
+            try:
+                await self.check(await asyncio.to_thread(probes), force)
+            except Exception as e:
+                print(f"[HEALTH] Error al comprobar las dependencias: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                force = True
+            except asyncio.TimeoutError:
+                force = False
+            self._wakeup.clear()
+
+    def _due(self, name: str, interval: Optional[float], now: float) -> bool:
+        target = self._targets.get(name)
+        if target is None or interval is None:
+            return True
+        # Margen de medio ciclo para no saltarse una vuelta por unos milisegundos
+        return now - target["checked_at"] >= interval - self.interval / 2
+
+    async def check(self, probes: Probes, force: bool = False):
+        """
+        Ejecuta a la vez las sondas que toca comprobar (todas con `force`) y
+        actualiza el estado
+        """
+        now = time.time()
+        names = [name for name in probes if force or self._due(name, probes[name][2], now)]
+        results = await asyncio.gather(*(self._probe(probes[name][0]) for name in names))
+        now = time.time()
+
+        for name in [name for name in self._targets if name not in probes]:
+            del self._targets[name]
+            self._latencies.pop(name, None)
+
+        for name, (status, latency_ms, error) in zip(names, results):
+            previous = self._targets.get(name, {})
+            latencies = self._latencies.setdefault(name, deque(maxlen=HEALTH_LATENCY_SAMPLES))
+            if latency_ms is not None:
+                latencies.append(latency_ms)
+            if status != previous.get("status"):
+                print(f"[HEALTH] {name}: {previous.get('status', 'unknown')} -> {status}")
+            self._targets[name] = {
+                **probes[name][1],
+                "check_interval_seconds": probes[name][2] or self.interval,
+                "status": status,
+                "error": error,
+                "latency_ms": round(latency_ms, 1) if latency_ms is not None else None,
+                "checked_at": now,
+                "last_ok_at": now if status == "connected" else previous.get("last_ok_at"),
+            }
+        self.last_check = now
+
+    async def _probe(self, probe: Probe) -> Tuple[str, Optional[float], Optional[str]]:
+        t0 = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(probe(), self.timeout)
+        except asyncio.TimeoutError:
+            return "timeout", None, f"Sin respuesta en {self.timeout}s"
+        except Exception as e:
+            return "disconnected", None, str(e) or type(e).__name__
+        latency_ms = (time.perf_counter() - t0) * 1000
+        if response.status_code == 200:
+            return "connected", latency_ms, None
+        return f"error_{response.status_code}", latency_ms, response.text[:200]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Último estado de cada dependencia con percentiles de latencia"""
+        result = {}
+        for name, target in self._targets.items():
+            latencies = self._latencies.get(name) or ()
+            result[name] = {
+                **target,
+                "checked_at": _iso(target["checked_at"]),
+                "last_ok_at": _iso(target["last_ok_at"]),
+                "latency_p50_ms": percentile(latencies, 50),
+                "latency_p95_ms": percentile(latencies, 95),
+                "latency_p99_ms": percentile(latencies, 99),
+                "samples": len(latencies),
+            }
+        return result
+
+_health_checker: Optional[HealthChecker] = None
+
+def get_health_checker() -> HealthChecker:
+    global _health_checker
+    if _health_checker is None:
+        _health_checker = HealthChecker()
+    return _health_checker
@@ -0,0 +1,105 @@
+# http_clients.py
+"""
+Clientes HTTP asíncronos compartidos (httpx).
+
+- Un AsyncClient por tenant contra la API de F5 XC, con pool de conexiones
+  HTTP/1.1 keep-alive que reutilizan todas las peticiones de ese tenant.
+- Un AsyncClient para Elasticsearch (sin verificación TLS, igual que antes).
+
+Los clientes se crean bajo demanda y se cierran con close_clients() al apagar
+la aplicación (o al final de asyncio.run en los scripts CLI).
+
+Todas las peticiones a XC toman el cliente con xc_client_lease(): si mientras
+tanto cambia el token del tenant, el cliente reemplazado no se cierra hasta que
+termina la última petición o exportación que lo usa.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+import httpx
+
+XC_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+XC_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=60)
+
+ELK_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+ELK_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=60)
+
+_xc_clients: Dict[str, httpx.AsyncClient] = {}
+_elk_client: Optional[httpx.AsyncClient] = None
+
+_leases: Dict[httpx.AsyncClient, int] = {}   # Cliente -> exportaciones que lo están usando
+_retired: set = set()                         # Clientes reemplazados que esperan a su última exportación
+
+def xc_base_url(tenant: str) -> str:
+    return f"https://{tenant}.console.ves.volterra.io"
+
+def get_xc_client(tenant: str, token: str) -> httpx.AsyncClient:
+    """
+    Retorna el cliente con pool de conexiones del tenant.
+    Si el token del tenant cambió, se reemplaza el cliente.
+    """
+    authorization = f"APIToken {token}"
+    client = _xc_clients.get(tenant)
+
+    if client is not None and not client.is_closed and client.headers.get('Authorization') == authorization:
+        return client
+
+    if client is not None and not client.is_closed:
+        if _leases.get(client):
+            _retired.add(client)
+        else:
+            _close_later(client)
+
+    client = httpx.AsyncClient(
+        base_url=xc_base_url(tenant),
+        headers={
+            'Authorization': authorization,
+            'Accept-Encoding': 'gzip, deflate',
+        },
+        timeout=XC_TIMEOUT,
+        limits=XC_LIMITS,
+    )
+    _xc_clients[tenant] = client
+    return client
+
+@asynccontextmanager
+async def xc_client_lease(tenant: str, token: str) -> AsyncIterator[httpx.AsyncClient]:
+    """Cliente del tenant que no se cierra mientras dure el bloque (aunque se reemplace)"""
+    client = get_xc_client(tenant, token)
+    _leases[client] = _leases.get(client, 0) + 1
+    try:
+        yield client
+    finally:
+        _leases[client] -= 1
+        if not _leases[client]:
+            del _leases[client]
+            if client in _retired:
+                _retired.discard(client)
+                await client.aclose()
+
+def get_elk_client() -> httpx.AsyncClient:
+    """Cliente compartido para Elasticsearch (URL y auth se pasan por petición)"""
+    global _elk_client
+    if _elk_client is None or _elk_client.is_closed:
+        _elk_client = httpx.AsyncClient(timeout=ELK_TIMEOUT, limits=ELK_LIMITS, verify=False)
+    return _elk_client
+
+def _close_later(client: httpx.AsyncClient):
+    """Cierra un cliente reemplazado sin bloquear a quien pidió el nuevo"""
+    try:
+        asyncio.get_running_loop().create_task(client.aclose())
+    except RuntimeError:
+        pass
+
+async def close_clients():
+    """Cierra todos los clientes abiertos"""
+    global _elk_client
+    clients = list(_xc_clients.values()) + list(_retired)
+    _xc_clients.clear()
+    _retired.clear()
+    if _elk_client is not None:
+        clients.append(_elk_client)
+        _elk_client = None
+
+    for client in clients:
+        await client.aclose()
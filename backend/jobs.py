@@ -0,0 +1,183 @@
+# jobs.py
+"""
+Trabajos en segundo plano para exportaciones largas (CSV y envío a ELK).
+
+POST /api/jobs crea un trabajo y retorna su ID sin esperar a que termine; el
+trabajo corre en el event loop, limitado a `max_workers` a la vez, y publica su
+avance en `progress` (páginas, documentos descargados e indexados). Dos
+peticiones idénticas mientras la primera sigue activa comparten el mismo
+trabajo. Los trabajos se pueden cancelar y los terminados se conservan
+`keep_seconds` para poder consultar su resultado.
+
+iter_job_events produce los eventos de avance que /api/jobs/{id}/events
+envía como Server-Sent Events.
+"""
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import JOBS_ACTIVE, JOBS_FINISHED
+
+DEFAULT_MAX_JOBS = 2                 # Trabajos ejecutándose a la vez
+JOB_KEEP_SECONDS = 3600              # Tiempo que se conserva un trabajo terminado
+EVENT_INTERVAL_SECONDS = 0.5         # Intervalo entre eventos de avance
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+JobRunner = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+class Job:
+    """Un trabajo: parámetros, estado, avance y resultado"""
+
+    def __init__(self, kind: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.progress: Dict[str, Any] = {"pages": 0, "documents_fetched": 0, "documents_indexed": 0,
+                                         "batches_acked": 0, "truncated_events": 0}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[Any] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def key(self) -> Tuple:
+        return (self.kind, json.dumps(self.params, sort_keys=True))
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        progress = dict(self.progress)
+        progress["elapsed_seconds"] = round(elapsed, 2)
+        progress["fetch_docs_per_second"] = round(progress["documents_fetched"] / elapsed, 1) if elapsed > 0 else 0.0
+        progress["index_docs_per_second"] = round(progress["documents_indexed"] / elapsed, 1) if elapsed > 0 else 0.0
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobManager:
+    """Cola de trabajos con un número acotado de trabajos en ejecución"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_JOBS, keep_seconds: int = JOB_KEEP_SECONDS):
+        self.keep_seconds = keep_seconds
+        self._slots = asyncio.Semaphore(max_workers)
+        self._jobs: Dict[str, Job] = {}
+
+    def submit(self, kind: str, params: Dict[str, Any], runner: JobRunner) -> Tuple[Job, bool]:
+        """
+        Crea un trabajo que ejecuta `runner(progress)`, o retorna el trabajo activo
+        con los mismos parámetros. Retorna (job, creado).
+        """
+        self._prune()
+        job = Job(kind, params)
+        for existing in self._jobs.values():
+            if existing.status in ACTIVE_STATES and existing.key == job.key:
+                return existing, False
+
+        job.task = asyncio.create_task(self._run(job, runner))
+        self._jobs[job.id] = job
+        JOBS_ACTIVE.labels(kind=kind, state=QUEUED).inc()
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        self._prune()
+        return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancela un trabajo en cola o en ejecución; False si ya había terminado"""
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in ACTIVE_STATES:
+            return False
+        job.task.cancel()
+        return True
+
+    async def shutdown(self):
+        tasks = [job.task for job in self._jobs.values() if job.status in ACTIVE_STATES]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: Job, runner: JobRunner):
+        started = False
+        try:
+            async with self._slots:
+                JOBS_ACTIVE.labels(kind=job.kind, state=QUEUED).dec()
+                JOBS_ACTIVE.labels(kind=job.kind, state=RUNNING).inc()
+                job.status = RUNNING
+                started = True
+                job.started_at = time.time()
+                print(f"[JOBS] {job.id} iniciado: {job.kind} {job.params}")
+                job.result = await runner(job.progress)
+            job.status = COMPLETED
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status = FAILED
+            job.error = getattr(e, 'detail', None) or str(e)
+        finally:
+            job.finished_at = time.time()
+            JOBS_ACTIVE.labels(kind=job.kind, state=RUNNING if started else QUEUED).dec()
+            JOBS_FINISHED.labels(kind=job.kind, status=job.status).inc()
+            print(f"[JOBS] {job.id} {job.status}")
+
+    def _prune(self):
+        """Olvida los trabajos terminados hace más de keep_seconds"""
+        limit = time.time() - self.keep_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < limit]:
+            del self._jobs[job_id]
+
+async def iter_job_events(job: Job, interval: float = EVENT_INTERVAL_SECONDS) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Genera (evento, datos) mientras el trabajo está activo: un "progress" por
+    intervalo, con el ritmo actual (docs/s en el último intervalo) además del
+    promedio, y un "done" final con el estado completo del trabajo.
+    """
+    last_time = time.time()
+    last_fetched = job.progress["documents_fetched"]
+    last_indexed = job.progress["documents_indexed"]
+
+    while job.status in ACTIVE_STATES:
+        state = job.to_dict()
+        progress = state["progress"]
+        now = time.time()
+        elapsed = max(now - last_time, 1e-6)
+        progress["current_fetch_docs_per_second"] = round((progress["documents_fetched"] - last_fetched) / elapsed, 1)
+        progress["current_index_docs_per_second"] = round((progress["documents_indexed"] - last_indexed) / elapsed, 1)
+        last_time, last_fetched, last_indexed = now, progress["documents_fetched"], progress["documents_indexed"]
+
+        yield "progress", {"job_id": job.id, "kind": job.kind, "status": job.status, "progress": progress}
+        await asyncio.sleep(interval)
+
+    yield "done", job.to_dict()
+
+_job_manager: Optional[JobManager] = None
+
+def get_job_manager() -> JobManager:
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
@@ -0,0 +1,194 @@
+# log_aggregations.py
+"""
+Resúmenes de logs calculados por la API de F5 XC (campo "aggs").
+
+En lugar de descargar todos los eventos con scroll para contarlos, se pide a XC
+una sola consulta con agregaciones: top-k por campo (código de respuesta, país,
+IP de origen, evento de seguridad...) y un histograma por fecha. La respuesta
+es un resumen compacto que se guarda en memoria `AGG_CACHE_TTL_SECONDS`.
+Las peticiones simultáneas por el mismo resumen comparten una sola consulta a
+XC (single-flight, como en xc_listings).
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from http_clients import xc_client_lease
+from log_fetchers import XC_LOG_APIS, _time_window, _total_hits, log_query, normalize_filters
+
+# Campo del resumen -> campo de agregación de la API de XC, por tipo de log
+AGG_FIELDS = {
+    "access": {
+        "rsp_code": "RSP_CODE",
+        "country": "COUNTRY",
+        "src_ip": "SRC_IP",
+        "method": "METHOD",
+        "domain": "DOMAIN",
+    },
+    "security": {
+        "sec_event_name": "SEC_EVENT_NAME",
+        "country": "COUNTRY",
+        "src_ip": "SRC_IP",
+        "rsp_code": "RSP_CODE",
+    },
+}
+
+DEFAULT_AGG_FIELDS = {
+    "access": ["rsp_code", "country", "src_ip"],
+    "security": ["sec_event_name", "country", "src_ip"],
+}
+
+DEFAULT_TOPK = 10
+MAX_TOPK = 100
+HISTOGRAM_STEPS = [                   # Pasos del histograma de XC y su duración
+    ("1m", 60), ("5m", 300), ("15m", 900), ("30m", 1800), ("1h", 3600),
+    ("3h", 3 * 3600), ("6h", 6 * 3600), ("12h", 12 * 3600), ("1d", 24 * 3600),
+]
+MAX_HISTOGRAM_BUCKETS = 60
+AGG_CACHE_TTL_SECONDS = 60
+AGG_TIMEOUT_SECONDS = 20
+
+_agg_cache: Dict[Tuple, Tuple[float, dict]] = {}
+_inflight: Dict[Tuple, asyncio.Task] = {}
+
+def histogram_step(seconds: int) -> str:
+    """Paso más fino que deja el histograma en MAX_HISTOGRAM_BUCKETS barras o menos"""
+    for step, step_seconds in HISTOGRAM_STEPS:
+        if seconds / step_seconds <= MAX_HISTOGRAM_BUCKETS:
+            return step
+    return HISTOGRAM_STEPS[-1][0]
+
+def build_aggs(log_type: str, fields: List[str], topk: int, step: str) -> dict:
+    """Campo "aggs" de la consulta: un top-k por campo y el histograma"""
+    aggs = {
+        field: {"field_aggregation": {"field": AGG_FIELDS[log_type][field], "topk": topk}}
+        for field in fields
+    }
+    aggs["histogram"] = {"date_aggregation": {"step": step}}
+    return aggs
+
+def _count(bucket: dict) -> int:
+    try:
+        return int(bucket.get("count", bucket.get("doc_count", 0)))
+    except (TypeError, ValueError):
+        return 0
+
+def _buckets(agg: Optional[dict], kind: str) -> List[dict]:
+    """Buckets de una agregación de la respuesta (admite la forma con y sin envoltorio)"""
+    if not agg:
+        return []
+    return (agg.get(kind) or agg).get("buckets") or []
+
+def _bucket_time(key) -> str:
+    """Clave de un bucket del histograma (epoch en s o ms, o texto) como ISO 8601"""
+    try:
+        epoch = float(key)
+    except (TypeError, ValueError):
+        return str(key)
+    if epoch > 1e11:
+        epoch /= 1000
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def parse_aggs(data: dict, fields: List[str]) -> dict:
+    """Convierte la respuesta de XC en {terms: {campo: [{key, count}]}, histogram: [{time, count}]}"""
+    aggs = data.get("aggs") or {}
+    terms = {
+        field: [{"key": str(bucket.get("key", "")), "count": _count(bucket)}
+                for bucket in _buckets(aggs.get(field), "field_aggregation")]
+        for field in fields
+    }
+    histogram = sorted(
+        ({"time": _bucket_time(bucket.get("key")), "count": _count(bucket)}
+         for bucket in _buckets(aggs.get("histogram"), "date_aggregation")),
+        key=lambda bucket: bucket["time"]
+    )
+    return {"terms": terms, "histogram": histogram}
+
+async def fetch_aggregations(log_type: str, token: str, tenant: str, namespace: str, loadbalancer: str,
+                             hours: int, fields: Optional[List[str]] = None, topk: int = DEFAULT_TOPK,
+                             filters: Optional[dict] = None) -> dict:
+    """
+    Resumen de la ventana de las últimas `hours` horas con una sola consulta a XC,
+    limitado a los eventos que cumplen `filters` (ver log_fetchers.LOG_FILTERS).
+    Los resultados se reutilizan durante AGG_CACHE_TTL_SECONDS (`cached` indica
+    si la respuesta salió de la caché).
+    """
+    if log_type not in AGG_FIELDS:
+        raise ValueError(f"Tipo de log sin agregaciones: {log_type}. Valores permitidos: {list(AGG_FIELDS)}")
+    fields = fields or DEFAULT_AGG_FIELDS[log_type]
+    unknown = [field for field in fields if field not in AGG_FIELDS[log_type]]
+    if unknown:
+        raise ValueError(f"Campos no válidos para {log_type}: {unknown}. Valores permitidos: {list(AGG_FIELDS[log_type])}")
+    topk = max(1, min(topk, MAX_TOPK))
+    filters = normalize_filters(log_type, filters)
+
+    key = (tenant, namespace, loadbalancer, log_type, hours, tuple(fields), topk, tuple(sorted(filters.items())))
+    cached = _agg_cache.get(key)
+    if cached is not None and cached[0] > time.time():
+        return {**cached[1], "cached": True}
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_query_aggregations(key, log_type, token, tenant, namespace, loadbalancer,
+                                                         hours, fields, topk, filters))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _done(key, done))
+    # shield: si el navegador cancela, la consulta compartida sigue para los demás
+    summary = await asyncio.shield(task)
+    return {**summary, "cached": False}
+
+def _done(key: Tuple, task: asyncio.Task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[AGGS] Error en la consulta {key}: {task.exception()}")
+
+async def _query_aggregations(key: Tuple, log_type: str, token: str, tenant: str, namespace: str,
+                              loadbalancer: str, hours: int, fields: List[str], topk: int, filters: dict) -> dict:
+    """Consulta de agregaciones a XC; guarda el resumen en la caché con `key`"""
+    start_time, end_time = _time_window(hours)
+    step = histogram_step(end_time - start_time)
+    path, _ = XC_LOG_APIS[log_type]
+    payload = {
+        "aggs": build_aggs(log_type, fields, topk, step),
+        "end_time": str(end_time),
+        "limit": 1,
+        "namespace": namespace,
+        "query": log_query(log_type, loadbalancer, filters, tenant, namespace),
+        "scroll": False,
+        "sort": "DESCENDING",
+        "start_time": str(start_time),
+    }
+
+    t0 = time.time()
+    async with xc_client_lease(tenant, token) as client:
+        response = await client.post(f'/api/data/namespaces/{namespace}/{path}', json=payload,
+                                     timeout=AGG_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    data = response.json()
+    took_ms = int((time.time() - t0) * 1000)
+
+    summary = {
+        "tenant": tenant,
+        "namespace": namespace,
+        "loadbalancer": loadbalancer,
+        "log_type": log_type,
+        "filters": filters,
+        "window_start": start_time,
+        "window_end": end_time,
+        "total_hits": _total_hits(data),
+        "step": step,
+        **parse_aggs(data, fields),
+        "took_ms": took_ms,
+    }
+    print(f"[AGGS] {log_type} {tenant}/{namespace}/{loadbalancer} {hours}h: {summary['total_hits']} eventos en {took_ms}ms")
+
+    _prune_cache()
+    _agg_cache[key] = (time.time() + AGG_CACHE_TTL_SECONDS, summary)
+    return summary
+
+def _prune_cache():
+    now = time.time()
+    for key in [key for key, (expires, _) in _agg_cache.items() if expires <= now]:
+        del _agg_cache[key]
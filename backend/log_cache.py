@@ -0,0 +1,173 @@
+# log_cache.py
+"""
+Caché local en disco de eventos de F5 XC en buckets horarios.
+
+Cada bucket guarda las columnas ya parseadas (ver log_fetchers.new_columns) de
+una hora completa, identificada por (tenant, namespace, loadbalancer, log_type,
+hora). Solo se guardan horas cerradas, que se tratan como inmutables: la hora
+abierta (y el margen de ingesta de XC) se descarga siempre.
+
+Los archivos son JSON comprimido con gzip. Cuando el tamaño total supera
+`max_bytes` se eliminan los buckets usados hace más tiempo (LRU).
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+CACHE_DIR = os.path.join(os.getcwd(), "cache")
+CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024   # 2 GB
+BUCKET_SECONDS = 3600
+
+# Una hora se considera cerrada cuando terminó hace al menos este margen
+# (los eventos tardan un poco en estar disponibles en la API de XC)
+SETTLE_SECONDS = 10 * 60
+
+def _dumps(columns: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(columns)
+    return json.dumps(columns, separators=(',', ':')).encode('utf-8')
+
+def _loads(data: bytes) -> dict:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def closed_hours(start_time: int, end_time: int, now: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Retorna (first_hour, last_hour_end): el rango de horas completas y cerradas
+    dentro de [start_time, end_time). Si no hay ninguna, first_hour >= last_hour_end.
+    """
+    now = int(time.time()) if now is None else now
+    first_hour = -(-start_time // BUCKET_SECONDS) * BUCKET_SECONDS
+    last_hour_end = min(end_time, now - SETTLE_SECONDS) // BUCKET_SECONDS * BUCKET_SECONDS
+    return first_hour, last_hour_end
+
+class LogCache:
+    """Buckets horarios en disco con expulsión LRU por tamaño"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, list]] = None   # path -> [size, last_used]
+        self._total_bytes = 0
+
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def bucket_path(self, tenant: str, namespace: str, loadbalancer: Optional[str], log_type: str, hour: int) -> str:
+        parts = [quote(part or '_', safe='') for part in (tenant, namespace, loadbalancer, log_type)]
+        return os.path.join(self.cache_dir, *parts, f"{hour}.json.gz")
+
+    def get(self, tenant: str, namespace: str, loadbalancer: Optional[str], log_type: str,
+            hour: int) -> Optional[dict]:
+        """Columnas del bucket, o None si no está en caché"""
+        path = self.bucket_path(tenant, namespace, loadbalancer, log_type, hour)
+        try:
+            with open(path, 'rb') as f:
+                columns = _loads(gzip.decompress(f.read()))
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self.stats["hits"] += 1
+            entry = self._index().get(path)
+            if entry is not None:
+                entry[1] = time.time()
+        return columns
+
+    def put(self, tenant: str, namespace: str, loadbalancer: Optional[str], log_type: str,
+            hour: int, columns: dict):
+        """Guarda las columnas de una hora cerrada (escritura atómica)"""
+        path = self.bucket_path(tenant, namespace, loadbalancer, log_type, hour)
+        data = gzip.compress(_dumps(columns), compresslevel=1)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            entries = self._index()
+            previous = entries.get(path)
+            if previous is not None:
+                self._total_bytes -= previous[0]
+            entries[path] = [len(data), time.time()]
+            self._total_bytes += len(data)
+            self.stats["writes"] += 1
+            self._evict()
+
+    def drop(self, tenant: str, namespace: str, loadbalancer: Optional[str]):
+        """Elimina todos los buckets de un load balancer (p. ej. si cambió su query)"""
+        prefix = os.path.dirname(os.path.dirname(self.bucket_path(tenant, namespace, loadbalancer, "_", 0))) + os.sep
+        with self._lock:
+            entries = self._index()
+            for path in [path for path in entries if path.startswith(prefix)]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                self._total_bytes -= entries.pop(path)[0]
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._index()
+            return {"buckets": len(entries), "bytes": self._total_bytes, "max_bytes": self.max_bytes, **self.stats}
+
+    def _index(self) -> Dict[str, list]:
+        """Índice en memoria de los buckets (se construye una vez recorriendo el directorio)"""
+        if self._entries is None:
+            self._entries = {}
+            self._total_bytes = 0
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith('.json.gz'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    self._entries[path] = [st.st_size, st.st_mtime]
+                    self._total_bytes += st.st_size
+        return self._entries
+
+    def _evict(self):
+        """Elimina los buckets menos usados hasta quedar bajo max_bytes"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        for path, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            del self._entries[path]
+            self._total_bytes -= size
+            self.stats["evictions"] += 1
+
+_log_cache: Optional[LogCache] = None
+
+def get_log_cache() -> Optional[LogCache]:
+    """Caché compartida (None si está desactivada con max_bytes = 0)"""
+    global _log_cache
+    if _log_cache is None and CACHE_MAX_BYTES > 0:
+        _log_cache = LogCache()
+    return _log_cache
+
+def set_log_cache_dir(cache_dir: str):
+    """Usa `cache_dir` para la caché compartida (p. ej. --cache-dir de los scripts CLI)"""
+    global _log_cache
+    _log_cache = LogCache(cache_dir) if CACHE_MAX_BYTES > 0 else None
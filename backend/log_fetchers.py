@@ -1,108 +1,742 @@
 # log_fetchers.py
 from datetime import datetime
+import asyncio
+import ipaddress
 import json
-import requests
+import re
+import httpx
 import pandas as pd
 import time
+from typing import Dict, Optional, Tuple
 
-def fetch_access_logs(token: str, tenant: str, namespace: str, loadbalancer: str, hours: int) -> pd.DataFrame:
+from http_clients import xc_client_lease
+from log_cache import BUCKET_SECONDS, closed_hours, get_log_cache
+from timings import add_counts, add_time, timed
+from metrics import XC_PAGE_EVENTS, XC_PAGE_PARSE_SECONDS, XC_REQUEST_ERRORS, XC_REQUEST_SECONDS, XC_TRUNCATED_EVENTS
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson es opcional
+    _json_loads = json.loads
+
+# Columna del DataFrame y campo del evento de XC que se proyecta en ella
+ACCESS_FIELDS = [
+    ('Time', 'time'),
+    ('Request ID', 'req_id'),
+    ('Response Code', 'rsp_code'),
+    ('Source IP address', 'src_ip'),
+    ('Domain', 'original_authority'),
+    ('Country', 'country'),
+    ('City', 'city'),
+    ('Response Details', 'rsp_code_details'),
+    ('Method', 'method'),
+    ('Request Path', 'req_path'),
+]
+
+SECURITY_FIELDS = [
+    ('Time', 'time'),
+    ('Request ID', 'req_id'),
+    ('Event Type', 'sec_event_name'),
+    ('Source IP address', 'src_ip'),
+    ('X-Forwarded-For', 'x_forwarded_for'),
+    ('Country', 'country'),
+    ('City', 'city'),
+    ('Browser', 'browser_type'),
+    ('Domain', 'domain'),
+    ('Method', 'method'),
+    ('Request Path', 'req_path'),
+    ('Response Code', 'rsp_code'),
+]
+
+ACCESS_COLUMNS = [column for column, _ in ACCESS_FIELDS]
+
+SECURITY_COLUMNS = [column for column, _ in SECURITY_FIELDS]
+
+AUDIT_COLUMNS = ['Time', 'User', 'Namespace', 'Method', 'Request Path', 'Message']
+
+LOG_COLUMNS = {
+    "access": ACCESS_COLUMNS,
+    "audit": AUDIT_COLUMNS,
+    "security": SECURITY_COLUMNS,
+}
+
+# Columnas de baja cardinalidad que se guardan como category
+CATEGORICAL_COLUMNS = {'Response Code', 'Country', 'Method', 'Event Type', 'Browser', 'Namespace'}
+
+# Endpoint de la API de XC y clave con los eventos en cada página, por tipo de log
+XC_LOG_APIS = {
+    "access": ("access_logs", "logs"),
+    "audit": ("audit_logs", "logs"),
+    "security": ("app_security/events", "events"),
+}
+
+# Filtros opcionales que se agregan como condiciones a la query de XC: filtro -> tipos de log que lo admiten
+LOG_FILTERS = {
+    "rsp_code_class": ("access", "security"),   # 1..5 (o 1xx..5xx)
+    "src_ip": ("access", "security"),
+    "path_prefix": ("access", "security", "audit"),
+    "country": ("access", "security"),
+    "method": ("access", "security", "audit"),
+}
+
+# Formas del vh_name de un load balancer en los logs de XC, en el orden en que se prueban
+# (ver /api/diagnose). La primera es la que se usa mientras no se descubra otra.
+VH_NAME_PATTERNS = [
+    "ves-io-http-loadbalancer-{lb}",
+    "{lb}",
+    "ves-io-https-loadbalancer-{lb}",
+]
+
+# Parámetros del motor de scroll por ventanas de tiempo
+DEFAULT_MAX_WORKERS = 4               # Scrolls concurrentes contra la API de XC
+INITIAL_SLICE_SECONDS = 6 * 3600      # Tamaño de la primera ventana (sin información de densidad)
+MIN_SLICE_SECONDS = 5 * 60
+MAX_SLICE_SECONDS = 24 * 3600
+TARGET_EVENTS_PER_SLICE = 50000       # Eventos objetivo por ventana al adaptar el tamaño
+PIPELINE_QUEUE_PAGES = 8              # Páginas en cola entre el fetch y el consumidor (acota la memoria)
+CACHED_CHUNK_ROWS = 500               # Filas por bloque al entregar a on_rows una hora de la caché (~1 página)
+
+# (tenant, namespace, load balancer) -> patrón de vh_name descubierto por el diagnóstico
+# (main.py lo guarda en tenants.db y lo vuelve a cargar al arrancar)
+_vh_name_patterns: Dict[Tuple[str, str, str], str] = {}
+
+def new_columns(log_type: str) -> dict:
+    """Buffer columnar vacío (columna -> lista de valores) para un tipo de log"""
+    return {column: [] for column in LOG_COLUMNS[log_type]}
+
+def columns_to_dataframe(columns: dict) -> pd.DataFrame:
+    """Construye el DataFrame una sola vez a partir de las columnas"""
+    with timed("dataframe_build"):
+        return pd.DataFrame({
+            column: pd.Categorical(values) if column in CATEGORICAL_COLUMNS else values
+            for column, values in columns.items()
+        })
+
+def _add_progress(progress: dict, **counters):
+    for key, value in counters.items():
+        progress[key] = progress.get(key, 0) + value
+
+def _time_window(hours: int):
+    """Retorna (start_time, end_time) en epoch para las últimas `hours` horas"""
+    end_time = int(datetime.now().timestamp())
+    return end_time - (hours * 3600), end_time
+
+def _total_hits(page: dict) -> Optional[int]:
+    """total_hits de la primera página de XC (None si no viene o no es válido)"""
+    try:
+        return int(page["total_hits"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+async def _post_page(client: httpx.AsyncClient, url: str, payload: dict, request: str,
+                     labels: Optional[dict]) -> dict:
+    """
+    POST de una página de logs; con `labels` (tenant, log_type) registra latencia y errores.
+    La espera y el parseo se suman al desglose de tiempos actual (ver timings.py).
+    """
+    t0 = time.perf_counter()
+    try:
+        response = await client.post(url, json=payload)
+    except httpx.TransportError:
+        if labels is not None:
+            XC_REQUEST_ERRORS.labels(**labels, request=request, status="connection").inc()
+        raise
+    elapsed = time.perf_counter() - t0
+    add_time("network_wait", elapsed)
+    add_counts(xc_requests=1, bytes_received=response.num_bytes_downloaded or len(response.content))
+    if labels is not None:
+        XC_REQUEST_SECONDS.labels(**labels, request=request).observe(elapsed)
+        if response.is_error:
+            XC_REQUEST_ERRORS.labels(**labels, request=request, status=response.status_code).inc()
+    response.raise_for_status()
+    with timed("json_parse"):
+        return response.json()
+
+async def iter_scroll_pages(client: httpx.AsyncClient, base_url: str, payload: dict, items_key: str,
+                            meta: Optional[dict] = None, labels: Optional[dict] = None):
+    """
+    Itera de forma asíncrona las páginas de una consulta con scroll.
+    Cada elemento es la lista de eventos (strings JSON) de una página.
+    Si se indica `meta` se guarda en él el total_hits que informa XC.
+    Con `labels` ({"tenant", "log_type"}) se registran métricas de cada petición.
+    """
+    page = await _post_page(client, base_url, payload, "first_page", labels)
+    if meta is not None:
+        meta["total_hits"] = _total_hits(page)
+
+    if items_key not in page:
+        return
+
+    yield page[items_key]
+
+    scroll_url = f'{base_url}/scroll'
+
+    while page.get("scroll_id", "") != "":
+        scroll_payload = {
+            "namespace": payload["namespace"],
+            "scroll_id": page["scroll_id"]
+        }
+
+        page = await _post_page(client, scroll_url, scroll_payload, "scroll", labels)
+
+        if items_key in page:
+            yield page[items_key]
+
+async def scroll_time_slices(client: httpx.AsyncClient, namespace: str, log_type: str, query: str,
+                             start_time: int, end_time: int, process_batch,
+                             max_workers: int = DEFAULT_MAX_WORKERS, tag: str = "SCROLL",
+                             on_rows=None, progress: Optional[dict] = None, stats: Optional[dict] = None,
+                             tenant: Optional[str] = None) -> dict:
+    """
+    Motor de scroll paralelo por ventanas de tiempo.
+
+    Divide [start_time, end_time) en ventanas, de la más reciente a la más antigua,
+    y hace scroll de hasta `max_workers` ventanas a la vez sobre el pool de conexiones
+    del cliente. El tamaño de cada nueva ventana se ajusta con la densidad
+    (eventos/segundo) observada en las ventanas ya terminadas: se reduce si el
+    tráfico es denso y crece si es escaso.
+
+    `process_batch(events, columns)` agrega los eventos de una página al buffer
+    columnar (ver new_columns) y retorna cuántas filas agregó.
+
+    Retorna las columnas procesadas (columna -> lista) en orden DESCENDING.
+
+    Si se indica `on_rows` (corrutina), las columnas de cada página se le entregan
+    en cuanto se procesan y no se acumulan: la memoria queda acotada por página y
+    `on_rows` puede frenar el scroll (p. ej. esperando en una cola acotada).
+    En ese modo se retornan columnas vacías y el orden entre ventanas no se garantiza.
+
+    Si se indica `progress` (dict) se actualizan en él `pages` y `documents_fetched`
+    a medida que llegan las páginas.
+
+    Cada ventana se recorre hasta que XC deja de devolver scroll_id, sin límite de
+    scrolls. Si al terminar se recibieron menos eventos que el total_hits de XC,
+    la diferencia se reporta en `truncated_events` (en `progress` y en `stats`)
+    en lugar de perderse en silencio.
+
+    Las métricas (ver metrics.py) llevan las etiquetas `tenant` y `log_type`.
+    """
+    path, items_key = XC_LOG_APIS[log_type]
+    base_url = f'/api/data/namespaces/{namespace}/{path}'
+    labels = {"tenant": tenant, "log_type": log_type}
+    page_events = XC_PAGE_EVENTS.labels(**labels)
+    parse_seconds = XC_PAGE_PARSE_SECONDS.labels(**labels)
+
+    async def fetch_slice(slice_start, slice_end):
+        payload = {
+            "aggs": {},
+            "end_time": str(slice_end),
+            "limit": 0,
+            "namespace": namespace,
+            "sort": "DESCENDING",
+            "start_time": str(slice_start),
+            "scroll": True
+        }
+        if query:
+            payload["query"] = query
+
+        rows = new_columns(log_type)
+        count = 0
+        pages = 0
+        received = 0
+        meta = {}
+        async for events in iter_scroll_pages(client, base_url, payload, items_key, meta, labels):
+            pages += 1
+            received += len(events)
+            page_events.observe(len(events))
+            t0 = time.perf_counter()
+            if on_rows is None:
+                page_count = process_batch(events, rows)
+            else:
+                page_rows = new_columns(log_type)
+                page_count = process_batch(events, page_rows)
+            parse_elapsed = time.perf_counter() - t0
+            parse_seconds.observe(parse_elapsed)
+            add_time("json_parse", parse_elapsed)
+            add_counts(pages=1)
+            count += page_count
+            if progress is not None:
+                _add_progress(progress, pages=1, documents_fetched=page_count)
+            if on_rows is not None and page_count:
+                await on_rows(page_rows)
+
+        total_hits = meta.get("total_hits")
+        missing = max(total_hits - received, 0) if total_hits is not None else 0
+        if missing:
+            print(f"[{tag} WARN] Ventana truncada: {received} de {total_hits} eventos "
+                  f"({datetime.fromtimestamp(slice_start)} -> {datetime.fromtimestamp(slice_end)})")
+            XC_TRUNCATED_EVENTS.labels(**labels).inc(missing)
+            if progress is not None:
+                _add_progress(progress, truncated_events=missing)
+        return rows, count, max(pages - 1, 0), missing
+
+    results = {}
+    pending = {}
+    cursor = end_time
+    slice_seconds = min(INITIAL_SLICE_SECONDS, max(MIN_SLICE_SECONDS, (end_time - start_time) // max(max_workers, 1)))
+    slice_index = 0
+    total_rows = 0
+    total_scrolls = 0
+    truncated_events = 0
+    truncated_slices = 0
+
+    t0 = time.time()
+    try:
+        while cursor > start_time or pending:
+            # Mantener todos los workers ocupados con nuevas ventanas
+            while cursor > start_time and len(pending) < max_workers:
+                slice_start = max(start_time, cursor - slice_seconds)
+                task = asyncio.create_task(fetch_slice(slice_start, cursor))
+                pending[task] = (slice_index, slice_start, cursor)
+                slice_index += 1
+                cursor = slice_start
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                idx, slice_start, slice_end = pending.pop(task)
+                rows, count, scrolls, missing = task.result()
+                results[idx] = rows
+                total_rows += count
+                total_scrolls += scrolls
+                truncated_events += missing
+                truncated_slices += 1 if missing else 0
+
+                # Ajustar el tamaño de la siguiente ventana según la densidad observada
+                density = count / max(slice_end - slice_start, 1)
+                if density > 0:
+                    slice_seconds = int(TARGET_EVENTS_PER_SLICE / density)
+                else:
+                    slice_seconds *= 2
+                slice_seconds = max(MIN_SLICE_SECONDS, min(MAX_SLICE_SECONDS, slice_seconds))
+
+                print(f"[{tag}] Ventana {idx + 1}: {count} logs, {scrolls} scrolls "
+                      f"({datetime.fromtimestamp(slice_start)} -> {datetime.fromtimestamp(slice_end)})")
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+
+    print(f"[{tag}] {slice_index} ventanas, {total_scrolls} scrolls, {total_rows} logs en {time.time()-t0:.2f}s"
+          + (f", {truncated_events} eventos truncados en {truncated_slices} ventanas" if truncated_events else ""))
+    if stats is not None:
+        _add_progress(stats, truncated_events=truncated_events, truncated_slices=truncated_slices)
+
+    # Las ventanas se generaron de la más reciente a la más antigua: concatenar en ese orden
+    logs_data = new_columns(log_type)
+    for idx in sorted(results):
+        for column, values in results[idx].items():
+            logs_data[column].extend(values)
+    return logs_data
+
+async def fetch_time_window(client: httpx.AsyncClient, tenant: str, namespace: str, loadbalancer: Optional[str],
+                            log_type: str, query: Optional[str], start_time: int, end_time: int, process_batch,
+                            max_workers: int = DEFAULT_MAX_WORKERS, tag: str = "SCROLL", on_rows=None,
+                            progress: Optional[dict] = None, stats: Optional[dict] = None,
+                            use_cache: bool = True) -> dict:
+    """
+    scroll_time_slices con la caché horaria en disco (ver log_cache).
+
+    Las horas completas y cerradas de [start_time, end_time) se leen de la caché
+    y solo se descargan las que faltan (hasta `max_workers` a la vez), que se
+    guardan al terminar. El tramo abierto más reciente y el tramo parcial inicial
+    se descargan siempre. Misma interfaz y orden que scroll_time_slices.
+    Las horas truncadas (ver scroll_time_slices) no se guardan en la caché.
+    Con `on_rows` las horas descargadas se entregan página a página y las
+    leídas de la caché en bloques de CACHED_CHUNK_ROWS filas.
+    Con `use_cache` False (consultas con filtros) se descarga todo sin caché.
+    """
+    cache = get_log_cache() if use_cache else None
+    first_hour, last_hour_end = closed_hours(start_time, end_time)
+    if cache is None or first_hour >= last_hour_end:
+        return await scroll_time_slices(client, namespace, log_type, query, start_time, end_time,
+                                        process_batch, max_workers, tag, on_rows, progress, stats, tenant)
+
+    slots = asyncio.Semaphore(max_workers)
+    counts = {"hits": 0, "misses": 0}
+
+    async def load_hour(hour):
+        # El slot se mantiene mientras on_rows frena: como mucho `max_workers` horas en memoria
+        async with slots:
+            columns = await asyncio.to_thread(cache.get, tenant, namespace, loadbalancer, log_type, hour)
+            if columns is not None:
+                counts["hits"] += 1
+                add_counts(cached_hours=1)
+                total = len(columns['Time'])
+                if progress is not None:
+                    _add_progress(progress, cached_hours=1, documents_fetched=total)
+                if on_rows is None:
+                    return columns
+                # Entregar la hora en bloques del tamaño de una página, como si llegara de XC
+                for start in range(0, total, CACHED_CHUNK_ROWS):
+                    await on_rows({column: values[start:start + CACHED_CHUNK_ROWS]
+                                   for column, values in columns.items()})
+                return new_columns(log_type)
+
+            counts["misses"] += 1
+            hour_stats = {}
+            hour_rows = None
+            if on_rows is not None:
+                # Cada página sigue a on_rows en cuanto llega; se guarda una copia para la caché
+                hour_rows = new_columns(log_type)
+
+                async def forward(page_rows):
+                    for column, values in page_rows.items():
+                        hour_rows[column].extend(values)
+                    await on_rows(page_rows)
+            else:
+                forward = None
+            columns = await scroll_time_slices(client, namespace, log_type, query, hour, hour + BUCKET_SECONDS,
+                                               process_batch, 1, tag, forward, progress=progress, stats=hour_stats,
+                                               tenant=tenant)
+            if stats is not None:
+                _add_progress(stats, **hour_stats)
+            if not hour_stats["truncated_events"]:
+                await asyncio.to_thread(cache.put, tenant, namespace, loadbalancer, log_type, hour,
+                                        hour_rows if hour_rows is not None else columns)
+            return columns
+
+    # Tramo abierto (más reciente), horas cerradas y tramo parcial inicial, en orden DESCENDING
+    head = await scroll_time_slices(client, namespace, log_type, query, last_hour_end, end_time,
+                                    process_batch, max_workers, tag, on_rows, progress, stats, tenant)
+
+    tasks = [asyncio.create_task(load_hour(hour))
+             for hour in range(last_hour_end - BUCKET_SECONDS, first_hour - 1, -BUCKET_SECONDS)]
+    try:
+        hours = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    print(f"[{tag}] Caché: {counts['hits']} horas en caché, {counts['misses']} descargadas")
+
+    tail = new_columns(log_type)
+    if start_time < first_hour:
+        tail = await scroll_time_slices(client, namespace, log_type, query, start_time, first_hour,
+                                        process_batch, max_workers, tag, on_rows, progress, stats, tenant)
+
+    logs_data = new_columns(log_type)
+    for piece in (head, *hours, tail):
+        for column, values in piece.items():
+            logs_data[column].extend(values)
+    return logs_data
+
+def vh_name_pattern(tenant: Optional[str], namespace: Optional[str], loadbalancer: str) -> str:
+    """Patrón de vh_name del load balancer: el descubierto por el diagnóstico o el por defecto"""
+    return _vh_name_patterns.get((tenant, namespace, loadbalancer), VH_NAME_PATTERNS[0])
+
+def load_vh_name_patterns(patterns: Dict[Tuple[str, str, str], str]):
+    """Carga los patrones guardados (p. ej. en tenants.db al arrancar) sin tocar la caché en disco"""
+    _vh_name_patterns.update({key: pattern for key, pattern in patterns.items() if pattern in VH_NAME_PATTERNS})
+
+def remember_vh_name_pattern(tenant: str, namespace: str, loadbalancer: str, pattern: str):
+    """
+    Guarda el patrón de vh_name que devolvió logs para el load balancer. Si cambia,
+    se descartan sus horas en la caché en disco (se descargaron con otra query).
+    """
+    if pattern not in VH_NAME_PATTERNS:
+        raise ValueError(f"Patrón de vh_name desconocido: {pattern}")
+    if pattern == vh_name_pattern(tenant, namespace, loadbalancer):
+        return
+    _vh_name_patterns[(tenant, namespace, loadbalancer)] = pattern
+    cache = get_log_cache()
+    if cache is not None:
+        cache.drop(tenant, namespace, loadbalancer)
+    print(f"[QUERY] {tenant}/{namespace}/{loadbalancer}: vh_name=\"{pattern.format(lb=loadbalancer)}\"")
+
+def _vh_name_matcher(loadbalancer: str, pattern: str = VH_NAME_PATTERNS[0]) -> str:
+    return f'vh_name="{pattern.format(lb=loadbalancer)}"'
+
+def normalize_filters(log_type: str, filters: Optional[dict]) -> dict:
+    """
+    Valida y normaliza los filtros (ver LOG_FILTERS); ignora los vacíos.
+    ValueError si un filtro no existe, no aplica al tipo de log o no es válido.
+    """
+    result = {}
+    for name, value in (filters or {}).items():
+        value = str(value).strip() if value is not None else ''
+        if not value:
+            continue
+        if name not in LOG_FILTERS:
+            raise ValueError(f"Filtro desconocido: {name}. Valores permitidos: {list(LOG_FILTERS)}")
+        if log_type not in LOG_FILTERS[name]:
+            raise ValueError(f"El filtro '{name}' no aplica a los logs de tipo {log_type}")
+        if '"' in value or '\\' in value:
+            raise ValueError(f"Valor no válido para el filtro '{name}': {value}")
+
+        if name == "rsp_code_class":
+            value = value.lower().rstrip('x')
+            if value not in ("1", "2", "3", "4", "5"):
+                raise ValueError(f"rsp_code_class debe ser 1xx, 2xx, 3xx, 4xx o 5xx: {filters[name]}")
+        elif name == "src_ip":
+            try:
+                value = str(ipaddress.ip_address(value))
+            except ValueError:
+                raise ValueError(f"src_ip no es una dirección IP válida: {value}")
+        elif name == "path_prefix":
+            if not value.startswith('/'):
+                raise ValueError(f"path_prefix debe empezar con '/': {value}")
+        elif name == "method":
+            value = value.upper()
+            if not value.isalpha():
+                raise ValueError(f"Método HTTP no válido: {value}")
+        result[name] = value
+    return result
+
+def _filter_matchers(filters: dict) -> list:
+    """Condiciones de la query de XC para los filtros ya normalizados"""
+    matchers = []
+    if "rsp_code_class" in filters:
+        matchers.append(f'rsp_code=~"{filters["rsp_code_class"]}[0-9][0-9]"')
+    if "src_ip" in filters:
+        matchers.append(f'src_ip="{filters["src_ip"]}"')
+    if "path_prefix" in filters:
+        # Regex sobre req_path; las barras invertidas del escape se duplican dentro del string
+        pattern = re.escape(filters["path_prefix"]).replace('\\', '\\\\')
+        matchers.append(f'req_path=~"{pattern}.*"')
+    if "country" in filters:
+        matchers.append(f'country="{filters["country"]}"')
+    if "method" in filters:
+        matchers.append(f'method="{filters["method"]}"')
+    return matchers
+
+def log_query(log_type: str, loadbalancer: Optional[str], filters: Optional[dict] = None,
+              tenant: Optional[str] = None, namespace: Optional[str] = None) -> Optional[str]:
+    """
+    Query de XC para un tipo de log: el vh_name del load balancer (salvo audit)
+    y las condiciones de los filtros, que XC aplica antes de paginar.
+    Con `tenant` y `namespace` se usa el patrón de vh_name descubierto para el LB.
+    """
+    if log_type == "audit":
+        matchers = []
+    else:
+        matchers = [_vh_name_matcher(loadbalancer, vh_name_pattern(tenant, namespace, loadbalancer))]
+    matchers += _filter_matchers(normalize_filters(log_type, filters))
+    return "{" + ", ".join(matchers) + "}" if matchers else None
+
+async def stream_logs(log_type: str, token: str, tenant: str, namespace: str, loadbalancer: str, hours: int,
+                      on_rows, max_workers: int = DEFAULT_MAX_WORKERS,
+                      window: Optional[Tuple[int, int]] = None, progress: Optional[dict] = None,
+                      stats: Optional[dict] = None, filters: Optional[dict] = None) -> int:
+    """
+    Fetch en streaming: entrega a `on_rows` las columnas de cada página sin acumularlas.
+    Si se indica `window` (start_time, end_time) se usa en lugar de las últimas `hours` horas.
+    `filters` (ver LOG_FILTERS) se aplican en la query de XC.
+    Retorna el total de filas entregadas (`stats` recibe truncated_events, ver scroll_time_slices).
+    """
+    if log_type not in XC_LOG_APIS:
+        raise ValueError(f"Tipo de log no válido: {log_type}")
+
+    process_batch = {
+        "access": _process_logs_batch,
+        "security": _process_security_batch,
+        "audit": _process_audit_batch,
+    }[log_type]
+    query = log_query(log_type, loadbalancer, filters, tenant, namespace)
+
+    total = 0
+
+    async def count_rows(columns):
+        nonlocal total
+        total += len(columns['Time'])
+        await on_rows(columns)
+
+    start_time, end_time = window or _time_window(hours)
+    print(f"[STREAM] Iniciando descarga en streaming: type={log_type}, "
+          f"{datetime.fromtimestamp(start_time)} -> {datetime.fromtimestamp(end_time)}")
+    async with xc_client_lease(tenant, token) as client:
+        await fetch_time_window(client, tenant, namespace, loadbalancer if log_type != "audit" else None,
+                                log_type, query, start_time, end_time, process_batch, max_workers, "STREAM",
+                                on_rows=count_rows, progress=progress, stats=stats, use_cache=not filters)
+    return total
+
+async def iter_log_pages(log_type: str, token: str, tenant: str, namespace: str, loadbalancer: str, hours: int,
+                         max_workers: int = DEFAULT_MAX_WORKERS, window: Optional[Tuple[int, int]] = None,
+                         progress: Optional[dict] = None, queue_pages: int = PIPELINE_QUEUE_PAGES,
+                         stats: Optional[dict] = None, filters: Optional[dict] = None):
+    """
+    Generador asíncrono con las columnas de cada página a medida que se descargan.
+
+    stream_logs corre en una tarea productora que deja las páginas en una cola
+    acotada (`queue_pages`), así que el scroll avanza mientras el consumidor
+    procesa y se frena si el consumidor va más lento. Si se indica `stats` se
+    completan en él documents_fetched, fetch_time_seconds y truncated_events al
+    terminar el fetch.
+    Los errores del fetch se propagan al consumidor; cerrar el generador
+    (p. ej. con contextlib.aclosing) cancela el fetch.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_pages)
+    start_time = time.time()
+
+    async def producer():
+        # El marcador None indica fin de datos (también si el fetch falla);
+        # si el consumidor canceló al productor nadie lee ya la cola
+        try:
+            total = await stream_logs(log_type, token, tenant, namespace, loadbalancer, hours, queue.put,
+                                      max_workers, window=window, progress=progress, stats=stats,
+                                      filters=filters)
+            if stats is not None:
+                stats["documents_fetched"] = total
+                stats["fetch_time_seconds"] = round(time.time() - start_time, 2)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    producer_task = asyncio.create_task(producer())
+    try:
+        while True:
+            page = await queue.get()
+            if page is None:
+                break
+            yield page
+    finally:
+        # Propaga errores del productor (o espera su cancelación)
+        if not producer_task.done():
+            producer_task.cancel()
+        try:
+            await producer_task
+        except asyncio.CancelledError:
+            pass
+
+async def fetch_access_logs(token: str, tenant: str, namespace: str, loadbalancer: str, hours: int,
+                            max_workers: int = DEFAULT_MAX_WORKERS, progress: Optional[dict] = None,
+                            filters: Optional[dict] = None, use_cache: bool = True) -> pd.DataFrame:
     """
     Fetch access logs directamente (sin subprocess)
     """
     print(f"[LOG_FETCHER] Iniciando descarga: {hours}h")
-    logs_data = []
-    
-    current_time = int(datetime.now().timestamp())
-    end_time = current_time
-    start_time = end_time - (hours * 3600)
-    
-    # Session HTTP reutilizable
-    session = requests.Session()
-    session.headers.update({
-        'Authorization': f"APIToken {token}",
-        'Accept-Encoding': 'gzip, deflate',
-    })
-    
-    base_url = f'https://{tenant}.console.ves.volterra.io/api/data/namespaces/{namespace}/access_logs'
-    
-    payload = {
-        "aggs": {},
-        "end_time": str(end_time),
-        "limit": 0,
-        "namespace": namespace,
-        "query": f'{{vh_name="ves-io-http-loadbalancer-{loadbalancer}"}}',
-        "sort": "DESCENDING",
-        "start_time": str(start_time),
-        "scroll": True
-    }
-    
+    start_time, end_time = _time_window(hours)
+
     try:
-        # Primera petición
-        t0 = time.time()
-        response = session.post(base_url, json=payload, timeout=30)
-        response.raise_for_status()
-        access_logs = response.json()
-        print(f"[LOG_FETCHER] Primera petición: {time.time()-t0:.2f}s")
-        
-        if 'logs' in access_logs:
-            _process_logs_batch(access_logs['logs'], logs_data)
-            print(f"[LOG_FETCHER] Primera página: {len(logs_data)} logs")
-            
-            # Scroll
-            scroll_url = f'https://{tenant}.console.ves.volterra.io/api/data/namespaces/{namespace}/access_logs/scroll'
-            scroll_count = 0
-            
-            while access_logs.get("scroll_id", "") != "":
-                scroll_payload = {
-                    "namespace": namespace,
-                    "scroll_id": access_logs["scroll_id"]
-                }
-                
-                response = session.post(scroll_url, json=scroll_payload, timeout=30)
-                response.raise_for_status()
-                access_logs = response.json()
-                
-                if 'logs' in access_logs:
-                    _process_logs_batch(access_logs['logs'], logs_data)
-                    scroll_count += 1
-                    
-                    if scroll_count % 10 == 0:
-                        print(f"[LOG_FETCHER] Scroll #{scroll_count}: {len(logs_data)} logs")
-            
-            print(f"[LOG_FETCHER] Total scrolls: {scroll_count}")
-    
+        async with xc_client_lease(tenant, token) as client:
+            logs_data = await fetch_time_window(client, tenant, namespace, loadbalancer, "access",
+                                                log_query("access", loadbalancer, filters, tenant, namespace), start_time, end_time,
+                                                _process_logs_batch, max_workers, "LOG_FETCHER",
+                                                progress=progress, use_cache=use_cache and not filters)
     except Exception as e:
         print(f"[LOG_FETCHER ERROR] {str(e)}")
         raise
-    finally:
-        session.close()
-    
-    # Crear DataFrame
-    columns = ['Time', 'Request ID', 'Response Code', 'Source IP address', 
-               'Domain', 'Country', 'City', 'Response Details', 'Method', 'Request Path']
-    
-    if not logs_data:
-        return pd.DataFrame(columns=columns)
-    
-    print(f"[LOG_FETCHER] ✅ Total logs: {len(logs_data)}")
-    return pd.DataFrame(logs_data)
-
-def _process_logs_batch(logs, logs_data):
-    """Procesar logs en batch"""
-    parsed_logs = [json.loads(event) for event in logs]
-    
-    logs_data.extend([
-        {
-            'Time': log['time'],
-            'Request ID': log['req_id'],
-            'Response Code': log['rsp_code'],
-            'Source IP address': log['src_ip'],
-            'Domain': log['original_authority'],
-            'Country': log['country'],
-            'City': log['city'],
-            'Response Details': log['rsp_code_details'],
-            'Method': log['method'],
-            'Request Path': log['req_path']
-        }
-        for log in parsed_logs
+
+    total = len(logs_data['Time'])
+    if not total:
+        return pd.DataFrame(columns=ACCESS_COLUMNS)
+
+    print(f"[LOG_FETCHER] ✅ Total logs: {total}")
+    return await asyncio.to_thread(columns_to_dataframe, logs_data)
+
+async def fetch_security_logs(token: str, tenant: str, namespace: str, loadbalancer: str, hours: int,
+                              max_workers: int = DEFAULT_MAX_WORKERS, progress: Optional[dict] = None,
+                              filters: Optional[dict] = None, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Fetch security events directamente (sin subprocess).
+    Procesa páginas completas y construye el DataFrame una sola vez al final.
+    """
+    print(f"[SEC_FETCHER] Iniciando descarga: {hours}h")
+    start_time, end_time = _time_window(hours)
+
+    try:
+        async with xc_client_lease(tenant, token) as client:
+            logs_data = await fetch_time_window(client, tenant, namespace, loadbalancer, "security",
+                                                log_query("security", loadbalancer, filters, tenant, namespace), start_time, end_time,
+                                                _process_security_batch, max_workers, "SEC_FETCHER",
+                                                progress=progress, use_cache=use_cache and not filters)
+    except Exception as e:
+        print(f"[SEC_FETCHER ERROR] {str(e)}")
+        raise
+
+    total = len(logs_data['Time'])
+    if not total:
+        return pd.DataFrame(columns=SECURITY_COLUMNS)
+
+    print(f"[SEC_FETCHER] ✅ Total eventos: {total}")
+    return await asyncio.to_thread(columns_to_dataframe, logs_data)
+
+async def fetch_audit_logs(token: str, tenant: str, namespace: str, hours: int,
+                           max_workers: int = DEFAULT_MAX_WORKERS, progress: Optional[dict] = None,
+                           filters: Optional[dict] = None, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Fetch audit logs directamente (sin subprocess)
+    """
+    print(f"[AUDIT_FETCHER] Iniciando descarga: {hours}h")
+    start_time, end_time = _time_window(hours)
+
+    try:
+        async with xc_client_lease(tenant, token) as client:
+            logs_data = await fetch_time_window(client, tenant, namespace, None, "audit", log_query("audit", None, filters),
+                                                start_time, end_time, _process_audit_batch, max_workers, "AUDIT_FETCHER",
+                                                progress=progress, use_cache=use_cache and not filters)
+    except Exception as e:
+        print(f"[AUDIT_FETCHER ERROR] {str(e)}")
+        raise
+
+    total = len(logs_data['Time'])
+    if not total:
+        return pd.DataFrame(columns=AUDIT_COLUMNS)
+
+    print(f"[AUDIT_FETCHER] ✅ Total logs: {total}")
+    return await asyncio.to_thread(columns_to_dataframe, logs_data)
+
+async def fetch_logs(log_type: str, token: str, tenant: str, namespace: str, loadbalancer: str, hours: int,
+                     max_workers: int = DEFAULT_MAX_WORKERS, progress: Optional[dict] = None,
+                     filters: Optional[dict] = None, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Fetch del tipo de log indicado (access | audit | security), con `filters`
+    opcionales (ver LOG_FILTERS). Con `use_cache` False no se lee ni escribe
+    la caché horaria en disco.
+    """
+    if log_type == "access":
+        return await fetch_access_logs(token, tenant, namespace, loadbalancer, hours, max_workers, progress, filters,
+                                       use_cache)
+    if log_type == "security":
+        return await fetch_security_logs(token, tenant, namespace, loadbalancer, hours, max_workers, progress, filters,
+                                         use_cache)
+    if log_type == "audit":
+        return await fetch_audit_logs(token, tenant, namespace, hours, max_workers, progress, filters, use_cache)
+    raise ValueError(f"Tipo de log no válido: {log_type}")
+
+def _load_events(events) -> list:
+    """Parsea los eventos JSON de una página (ignora los que no se pueden parsear)"""
+    try:
+        return [_json_loads(event) for event in events]
+    except ValueError:
+        parsed = []
+        for event in events:
+            try:
+                parsed.append(_json_loads(event))
+            except ValueError:
+                continue
+        return parsed
+
+def _project_fields(parsed, fields, columns) -> int:
+    """Agrega a cada columna el campo proyectado de todos los eventos de la página"""
+    for column, key in fields:
+        columns[column].extend([log.get(key) for log in parsed])
+    return len(parsed)
+
+def _process_logs_batch(logs, columns) -> int:
+    """Procesar una página de access logs en columnas"""
+    return _project_fields(_load_events(logs), ACCESS_FIELDS, columns)
+
+def _process_security_batch(events, columns) -> int:
+    """Procesar una página de eventos de seguridad en columnas"""
+    return _project_fields(_load_events(events), SECURITY_FIELDS, columns)
+
+def _process_audit_batch(logs, columns) -> int:
+    """Procesar una página de audit logs en columnas (ignora eventos que no se pueden parsear)"""
+    parsed = _load_events(logs)
+
+    columns['Time'].extend([log.get('time', '') for log in parsed])
+    columns['User'].extend([log.get('user', '') for log in parsed])
+    columns['Namespace'].extend([log.get('namespace', '') for log in parsed])
+    columns['Method'].extend([log.get('method', '') for log in parsed])
+    columns['Request Path'].extend([(log.get('req_path') or '').split('?')[0] for log in parsed])
+    columns['Message'].extend([
+        next((log[k] for k in log if k.endswith('user_message')), '')
+        for log in parsed
     ])
+    return len(parsed)
@@ -1,20 +1,32 @@
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import Depends, FastAPI, Header, Query, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import subprocess
 import os
-import glob
 import time
-import sqlite3
-import requests
-from contextlib import contextmanager
+import zlib
+import asyncio
+import hashlib
+import httpx
+from contextlib import aclosing, contextmanager
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import json
+import pandas as pd
 
 # Importar función optimizada
-from log_fetchers import fetch_access_logs
+from log_fetchers import (fetch_logs, iter_log_pages, new_columns, normalize_filters, log_query,
+                          load_vh_name_patterns, remember_vh_name_pattern, LOG_COLUMNS, VH_NAME_PATTERNS)
+from log_aggregations import fetch_aggregations
+from jobs import get_job_manager, iter_job_events
+from health import HEALTH_CHECK_SLOW_INTERVAL_SECONDS, get_health_checker
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from timings import add_counts, log_timings, start_timings, timed
+from http_clients import get_elk_client, close_clients, xc_base_url, xc_client_lease
+from elk_bulk import BulkIndexer, DEFAULT_MAX_IN_FLIGHT, DEFAULT_TARGET_BYTES, ID_MODES
+from db_pool import SQLitePool
+from xc_listings import etag_matches, get_listing_loadbalancers, get_listing_namespaces, invalidate_listings
+from export_formats import DEFAULT_FORMAT, check_format, file_extension, media_type_for, write_dataframe
 
 app = FastAPI(title="F5 XC Log Viewer")
 
@@ -25,9 +37,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],   # El frontend revalida los listados con If-None-Match
 )
 
-# Directorio donde se guardarán los CSV generados
+# Directorio donde se guardarán los archivos generados (CSV, Parquet, NDJSON)
 LOG_DIR = os.path.join(os.getcwd(), "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
@@ -55,6 +68,19 @@ ELK_INDICES = {
     "security": "f5xc-security-events"
 }
 
+# Páginas de XC en cola entre el fetch y el envío Bulk (acota la memoria del pipeline)
+ELK_PIPELINE_QUEUE_PAGES = 8
+
+# Filas por bloque de enriquecimiento vectorizado en el pipeline
+ELK_ENRICH_CHUNK_ROWS = 5000
+
+# Solapamiento al reanudar desde el watermark en modo incremental (eventos que
+# XC publica con retraso respecto a su timestamp)
+ELK_INCREMENTAL_OVERLAP_SECONDS = 5 * 60
+
+# Campos candidatos para @timestamp, en orden de preferencia
+TIMESTAMP_FIELDS = ['timestamp', 'time', 'Time', 'date', 'req_time', 'start_time']
+
 # ==========================================
 # MODELOS PYDANTIC
 # ==========================================
@@ -72,6 +98,18 @@ class ElkConfig(BaseModel):
     username: Optional[str] = None
     password: Optional[str] = None
 
+class JobRequest(BaseModel):
+    kind: str                        # "csv" | "elk"
+    log_type: str
+    tenant: str
+    namespace: str
+    loadbalancer: Optional[str] = None
+    hours: int = 24
+    incremental: bool = False        # Solo kind "elk"
+    id_mode: str = "create"          # Solo kind "elk"
+    format: str = DEFAULT_FORMAT     # Solo kind "csv": csv | csv.gz | parquet | ndjson.gz | ndjson.zst
+    filters: Optional[Dict[str, str]] = None   # Ver log_fetchers.LOG_FILTERS
+
 class ElkSendRequest(BaseModel):
     log_type: str
     tenant: str
@@ -82,15 +120,37 @@ class ElkSendRequest(BaseModel):
 # ==========================================
 # FUNCIONES DE BASE DE DATOS
 # ==========================================
+_db_pool: Optional[SQLitePool] = None
+
+# Caché en memoria de las lecturas de cada petición (tokens y config de ELK).
+# Se invalida en los endpoints que escriben esas tablas.
+_token_cache: Dict[str, str] = {}
+_elk_config_cache: Optional[Dict[str, Any]] = None   # Fila de elk_config ({} si no hay)
+
 @contextmanager
 def get_db():
-    """Context manager para conexiones a la base de datos"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
+    """Context manager para conexiones a la base de datos (pool con WAL)"""
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = SQLitePool(DB_PATH)
+    with _db_pool.connection() as conn:
         yield conn
-    finally:
-        conn.close()
+
+def close_db():
+    global _db_pool
+    if _db_pool is not None:
+        _db_pool.close()
+        _db_pool = None
+
+def invalidate_db_cache(tenant: Optional[str] = None, elk_config: bool = False):
+    """Descarta de la caché el token de `tenant` y/o la configuración de ELK"""
+    global _elk_config_cache
+    if tenant is not None:
+        _token_cache.pop(tenant, None)
+        invalidate_listings(tenant)
+    if elk_config:
+        _elk_config_cache = None
+    get_health_checker().request_check()
 
 def init_db():
     """Inicializar la base de datos"""
@@ -115,15 +175,50 @@ def init_db():
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        # Último instante enviado a ELK por (tenant, namespace, LB, tipo de log)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS elk_watermarks (
+                tenant TEXT NOT NULL,
+                namespace TEXT NOT NULL,
+                loadbalancer TEXT NOT NULL DEFAULT '',
+                log_type TEXT NOT NULL,
+                watermark INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (tenant, namespace, loadbalancer, log_type)
+            )
+        """)
+        # Patrón de vh_name descubierto por /api/diagnose para cada LB (ver log_fetchers.VH_NAME_PATTERNS)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS vh_name_patterns (
+                tenant TEXT NOT NULL,
+                namespace TEXT NOT NULL,
+                loadbalancer TEXT NOT NULL,
+                pattern TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (tenant, namespace, loadbalancer)
+            )
+        """)
         conn.commit()
 
 # Inicializar DB al arrancar
 @app.on_event("startup")
 def startup_event():
     init_db()
+    load_vh_name_patterns(get_vh_name_patterns())
     print(f"[INFO] Base de datos inicializada en: {DB_PATH}")
     print(f"[INFO] Elasticsearch configurado en: {ELASTICSEARCH_CONFIG['url']}")
 
+@app.on_event("startup")
+async def start_health_checker():
+    get_health_checker().start(health_probes)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await get_health_checker().stop()
+    await get_job_manager().shutdown()
+    await close_clients()
+    close_db()
+
 # ==========================================
 # FUNCIONES AUXILIARES ELASTICSEARCH
 # ==========================================
@@ -135,12 +230,7 @@ def get_elk_auth():
     - auth: tupla (user, pass) si usa Basic Auth, None en caso contrario
     """
     # Primero intenta obtener de la base de datos
-    with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT url, auth_method, api_key, username, password 
-            FROM elk_config WHERE id = 1
-        """)
-        row = cursor.fetchone()
+    row = load_elk_config()
     
     if row and row['url']:
         config = {
@@ -167,158 +257,289 @@ def get_elk_auth():
     
     return config['url'], headers, auth
 
-def send_to_elasticsearch_bulk(logs: List[Dict[Any, Any]], index_name: str, batch_size: int = 5000) -> Dict[str, Any]:
+def load_elk_config() -> Dict[str, Any]:
+    """Fila de elk_config ({} si no hay), leída de la caché o de la base de datos"""
+    global _elk_config_cache
+    if _elk_config_cache is None:
+        with get_db() as conn:
+            row = conn.execute("""
+                SELECT url, auth_method, api_key, username, password 
+                FROM elk_config WHERE id = 1
+            """).fetchone()
+        _elk_config_cache = dict(row) if row else {}
+    return _elk_config_cache
+
+def get_elk_watermark(tenant: str, namespace: str, loadbalancer: Optional[str], log_type: str) -> Optional[int]:
+    """Watermark (epoch) del último envío completo a ELK, o None si no hay"""
+    with get_db() as conn:
+        row = conn.execute("""
+            SELECT watermark FROM elk_watermarks
+            WHERE tenant = ? AND namespace = ? AND loadbalancer = ? AND log_type = ?
+        """, (tenant, namespace, loadbalancer or '', log_type)).fetchone()
+    return row['watermark'] if row else None
+
+def set_elk_watermark(tenant: str, namespace: str, loadbalancer: Optional[str], log_type: str, watermark: int):
+    """Avanza el watermark (nunca lo retrocede)"""
+    with get_db() as conn:
+        conn.execute("""
+            INSERT INTO elk_watermarks (tenant, namespace, loadbalancer, log_type, watermark, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(tenant, namespace, loadbalancer, log_type) DO UPDATE SET
+                watermark = MAX(watermark, excluded.watermark),
+                updated_at = CURRENT_TIMESTAMP
+        """, (tenant, namespace, loadbalancer or '', log_type, watermark))
+        conn.commit()
+
+def get_vh_name_patterns() -> Dict[Tuple[str, str, str], str]:
+    """Patrones de vh_name guardados: (tenant, namespace, LB) -> patrón"""
+    with get_db() as conn:
+        rows = conn.execute("SELECT tenant, namespace, loadbalancer, pattern FROM vh_name_patterns").fetchall()
+    return {(row['tenant'], row['namespace'], row['loadbalancer']): row['pattern'] for row in rows}
+
+def set_vh_name_pattern(tenant: str, namespace: str, loadbalancer: str, pattern: str):
+    """Guarda el patrón de vh_name del LB para que sobreviva a los reinicios"""
+    with get_db() as conn:
+        conn.execute("""
+            INSERT INTO vh_name_patterns (tenant, namespace, loadbalancer, pattern, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(tenant, namespace, loadbalancer) DO UPDATE SET
+                pattern = excluded.pattern,
+                updated_at = CURRENT_TIMESTAMP
+        """, (tenant, namespace, loadbalancer, pattern))
+        conn.commit()
+
+def _bulk_result(stats: Dict[str, Any], index_name: str) -> Dict[str, Any]:
+    """Estadísticas finales de un envío Bulk"""
+    total_sent = stats["documents_sent"]
+    total_errors = stats["errors"]
+    total_duplicates = stats["duplicates"]
+    success = total_sent + total_duplicates > 0
+    message = f"Enviados {total_sent} documentos a {index_name}"
+    if total_duplicates > 0:
+        message += f" ({total_duplicates} ya existían)"
+    if total_errors > 0:
+        message += f" ({total_errors} errores)"
+    
+    print(f"[ELK] 📊 Total: {total_sent} enviados, {total_errors} errores, {stats['took_ms']}ms, "
+          f"{stats['docs_per_second']} docs/s, {stats['mb_per_second']} MB/s")
+    
+    return {
+        "success": success,
+        "documents_sent": total_sent,
+        "errors": total_errors,
+        "duplicates": total_duplicates,
+        "took_ms": stats["took_ms"],
+        "message": message,
+        "throughput": {
+            "docs_per_second": stats["docs_per_second"],
+            "mb_per_second": stats["mb_per_second"],
+            "bytes_sent": stats["bytes_sent"],
+            "batches": stats["batches"],
+            "retries": stats["retries"],
+            "throttled": stats["throttled"],
+            "elapsed_seconds": stats["elapsed_seconds"]
+        }
+    }
+
+def _new_bulk_indexer(index_name: str, elk_auth: Tuple[str, Dict[str, str], Any],
+                      max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                      target_bytes: int = DEFAULT_TARGET_BYTES, id_mode: str = "none",
+                      progress: Optional[Dict[str, Any]] = None, tenant: str = "",
+                      log_type: str = "") -> BulkIndexer:
+    """Crea un BulkIndexer para la configuración ELK `elk_auth` (resultado de get_elk_auth)"""
+    elk_url, headers, auth = elk_auth
+    
+    # Headers para Bulk API
+    bulk_headers = headers.copy()
+    bulk_headers["Content-Type"] = "application/x-ndjson"
+    
+    return BulkIndexer(get_elk_client(), f"{elk_url}/_bulk", bulk_headers, auth, index_name,
+                       max_in_flight=max_in_flight, target_bytes=target_bytes,
+                       op_type="create" if id_mode == "create" else "index", progress=progress,
+                       tenant=tenant, log_type=log_type)
+
+async def stream_to_elasticsearch(log_type: str, token: str, tenant: str, namespace: str, loadbalancer: Optional[str],
+                                  hours: int, index_name: str,
+                                  window: Optional[Tuple[int, int]] = None, id_mode: str = "none",
+                                  progress: Optional[Dict[str, Any]] = None,
+                                  filters: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
     """
-    Envía logs a Elasticsearch usando Bulk API en lotes.
+    Pipeline productor/consumidor de F5 XC a Elasticsearch.
+    
+    El productor hace scroll y deja las columnas de cada página en una cola acotada.
+    El consumidor las agrupa en bloques, los enriquece con _meta y @timestamp de
+    forma vectorizada y los pasa a un BulkIndexer, que envía lotes por tamaño en
+    bytes con varias peticiones en vuelo mientras el productor sigue descargando. La memoria depende del tamaño de lote
+    y de la cola, no de la ventana de tiempo.
     
-    Args:
-        logs: Lista de diccionarios con los logs
-        index_name: Nombre del índice destino
-        batch_size: Número de documentos por lote (default: 5000)
+    `window` (start_time, end_time) reemplaza a las últimas `hours` horas.
+    `id_mode`: "none" (_id autogenerado), "create" o "index" (_id estable, ver
+    document_ids). Si se indica `progress` se
+    actualizan en él las páginas y documentos descargados y los indexados.
+    `filters` (ver log_fetchers.LOG_FILTERS) se aplican en la query de XC.
     
     Returns:
-        Dict con estadísticas del envío
+        Dict con estadísticas del envío (+ documents_fetched, fetch_time_seconds y truncated_events)
     """
-    import urllib3
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    # La configuración ELK puede requerir leer tenants.db: fuera del event loop
+    elk_auth = await asyncio.to_thread(get_elk_auth)
+    indexer = _new_bulk_indexer(index_name, elk_auth, id_mode=id_mode, progress=progress, tenant=tenant,
+                                log_type=log_type)
+    ingested_at = _utc_now_iso()
+    fetch_stats = {"documents_fetched": 0, "fetch_time_seconds": 0.0, "truncated_events": 0}
     
-    if not logs:
-        return {
-            "success": True,
-            "documents_sent": 0,
-            "errors": 0,
-            "message": "No hay logs para enviar"
-        }
+    pending = new_columns(log_type)
+    pending_count = 0
     
-    elk_url, headers, auth = get_elk_auth()
-    bulk_url = f"{elk_url}/_bulk"
+    def columns_to_ndjson(columns):
+        with timed("dataframe_build"):
+            df = pd.DataFrame(columns)
+        with timed("enrichment"):
+            ids = document_ids(df, log_type, tenant) if id_mode != "none" else None
+        return dataframe_to_ndjson(df, log_type, tenant, namespace, loadbalancer, ingested_at), ids
     
-    # Headers para Bulk API
-    bulk_headers = headers.copy()
-    bulk_headers["Content-Type"] = "application/x-ndjson"
+    async def index_pending():
+        # Enriquecer y serializar por bloques de ELK_ENRICH_CHUNK_ROWS filas (vectorizado, fuera del event loop)
+        nonlocal pending, pending_count
+        columns, count = pending, pending_count
+        pending, pending_count = new_columns(log_type), 0
+        for start in range(0, count, ELK_ENRICH_CHUNK_ROWS):
+            if count > ELK_ENRICH_CHUNK_ROWS:
+                chunk = {column: values[start:start + ELK_ENRICH_CHUNK_ROWS] for column, values in columns.items()}
+            else:
+                chunk = columns
+            doc_lines, ids = await asyncio.to_thread(columns_to_ndjson, chunk)
+            with timed("bulk_wait"):
+                await indexer.add_ndjson(doc_lines, min(ELK_ENRICH_CHUNK_ROWS, count - start), ids)
     
-    total_sent = 0
-    total_errors = 0
-    total_took_ms = 0
+    pages = iter_log_pages(log_type, token, tenant, namespace, loadbalancer, hours, window=window,
+                           progress=progress, queue_pages=ELK_PIPELINE_QUEUE_PAGES, stats=fetch_stats,
+                           filters=filters)
+    try:
+        async with aclosing(pages):
+            async for page in pages:
+                for column, values in page.items():
+                    pending[column].extend(values)
+                pending_count += len(page['Time'])
+                if pending_count >= ELK_ENRICH_CHUNK_ROWS:
+                    await index_pending()
+        if pending_count:
+            await index_pending()
+        with timed("bulk_wait"):
+            stats = await indexer.close()
+    finally:
+        # Si la descarga falla o el trabajo se cancela no quedan peticiones Bulk sueltas
+        await indexer.abort()
+    add_counts(bulk_batches=stats["batches"], bytes_sent=stats["bytes_sent"])
     
-    # Dividir en lotes
-    total_batches = (len(logs) + batch_size - 1) // batch_size
-    print(f"[ELK] Enviando {len(logs)} documentos en {total_batches} lotes de {batch_size}")
+    result = _bulk_result(stats, index_name)
+    if fetch_stats["documents_fetched"] == 0:
+        result["success"] = True
+        result["message"] = "No se encontraron logs para el período especificado"
+    result.update(fetch_stats)
+    return result
+
+def _utc_now_iso() -> str:
+    return datetime.utcnow().isoformat() + 'Z'
+
+def _timestamp_column(df: pd.DataFrame, fallback: str) -> pd.Series:
+    """
+    Calcula @timestamp por columnas: para cada fila se usa el primer campo de
+    TIMESTAMP_FIELDS con valor (epoch -> ISO 8601, texto tal cual) y, si no hay
+    ninguno, `fallback`.
+    """
+    result = pd.Series(fallback, index=df.index, dtype=object)
+    missing = pd.Series(True, index=df.index)
     
-    for batch_num in range(total_batches):
-        start_idx = batch_num * batch_size
-        end_idx = min(start_idx + batch_size, len(logs))
-        batch = logs[start_idx:end_idx]
-        
-        # Construir payload para este lote
-        bulk_lines = []
-        for log in batch:
-            # Agregar timestamp si no existe
-            if '@timestamp' not in log:
-                log['@timestamp'] = datetime.utcnow().isoformat() + 'Z'
-            
-            # Línea de acción (index)
-            action = {"index": {"_index": index_name}}
-            bulk_lines.append(json.dumps(action))
-            
-            # Línea del documento
-            bulk_lines.append(json.dumps(log))
+    for field in TIMESTAMP_FIELDS:
+        if field not in df.columns:
+            continue
         
-        # El payload debe terminar con newline
-        bulk_payload = '\n'.join(bulk_lines) + '\n'
+        column = df[field]
+        if pd.api.types.is_numeric_dtype(column):
+            # Si es epoch, convertir
+            valid = column.notna() & (column != 0)
+            values = pd.to_datetime(column.where(valid), unit='s', utc=True).dt.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        else:
+            valid = column.notna() & column.astype(bool)
+            values = column
         
-        try:
-            response = requests.post(
-                bulk_url,
-                data=bulk_payload,
-                headers=bulk_headers,
-                auth=auth,
-                timeout=120,
-                verify=False
-            )
-            
-            if response.status_code not in [200, 201]:
-                print(f"[ELK] ❌ Lote {batch_num + 1}/{total_batches} falló: HTTP {response.status_code}")
-                total_errors += len(batch)
-                continue
-            
-            result = response.json()
-            
-            # Contar errores en este lote
-            batch_errors = 0
-            if result.get('errors', False):
-                for item in result.get('items', []):
-                    if 'error' in item.get('index', {}):
-                        batch_errors += 1
-            
-            batch_sent = len(batch) - batch_errors
-            total_sent += batch_sent
-            total_errors += batch_errors
-            total_took_ms += result.get('took', 0)
-            
-            print(f"[ELK] Lote {batch_num + 1}/{total_batches}: {batch_sent} enviados, {batch_errors} errores")
-            
-        except requests.exceptions.ConnectionError as e:
-            print(f"[ELK] Lote {batch_num + 1}/{total_batches} error de conexión: {str(e)}")
-            total_errors += len(batch)
-        except Exception as e:
-            print(f"[ELK] Lote {batch_num + 1}/{total_batches} error: {str(e)}")
-            total_errors += len(batch)
-    
-    success = total_sent > 0
-    message = f"Enviados {total_sent} documentos a {index_name}"
-    if total_errors > 0:
-        message += f" ({total_errors} errores)"
+        take = missing & valid
+        result = result.mask(take, values)
+        missing &= ~valid
+        if not missing.any():
+            break
     
-    print(f"[ELK] 📊 Total: {total_sent} enviados, {total_errors} errores, {total_took_ms}ms")
+    return result
+
+def _id_text(column: pd.Series) -> pd.Series:
+    """Texto de una columna para el _id (nulos como cadena vacía, igual con o sin category)"""
+    column = column.astype(object)
+    return column.where(column.notna(), '').astype(str)
+
+def _hash_rows(df: pd.DataFrame, columns: List[str], prefix: str) -> pd.Series:
+    joined = pd.Series(prefix, index=df.index, dtype=object)
+    for column in columns:
+        joined = joined + '|' + _id_text(df[column])
+    return pd.Series([hashlib.sha1(value.encode('utf-8')).hexdigest() for value in joined], index=df.index)
+
+def document_ids(df: pd.DataFrame, log_type: str, tenant: str) -> List[str]:
+    """
+    _id estable por evento para envíos idempotentes:
+    - access / security: Request ID + Time (hash de los campos si no hay Request ID)
+    - audit: hash de sus campos (y del tenant)
+    Solo se usan las columnas del log, no @timestamp ni _meta.
+    """
+    columns = [column for column in LOG_COLUMNS[log_type] if column in df.columns]
+    if log_type == "audit" or 'Request ID' not in df.columns:
+        return _hash_rows(df, columns, tenant).tolist()
     
+    request_id = _id_text(df['Request ID'])
+    ids = request_id + ':' + _id_text(df['Time'])
+    missing = request_id == ''
+    if missing.any():
+        ids[missing] = _hash_rows(df[missing], columns, tenant)
+    return ids.tolist()
+
+def _meta_for(log_type: str, tenant: str, namespace: str, loadbalancer: str, ingested_at: str) -> Dict[str, Any]:
     return {
-        "success": success,
-        "documents_sent": total_sent,
-        "errors": total_errors,
-        "took_ms": total_took_ms,
-        "message": message
+        'tenant': tenant,
+        'namespace': namespace,
+        'loadbalancer': loadbalancer,
+        'log_type': log_type,
+        'ingested_at': ingested_at
     }
 
-def dataframe_to_logs(df, log_type: str, tenant: str, namespace: str, loadbalancer: str = None) -> List[Dict]:
+def _with_timestamp(df: pd.DataFrame, ingested_at: str) -> pd.DataFrame:
+    enriched = df.copy(deep=False)
+    if '@timestamp' not in enriched.columns:
+        enriched['@timestamp'] = _timestamp_column(enriched, ingested_at)
+    return enriched
+
+def dataframe_to_ndjson(df, log_type: str, tenant: str, namespace: str, loadbalancer: str = None,
+                        ingested_at: str = None) -> bytes:
     """
-    Convierte un DataFrame de pandas a lista de diccionarios para Elasticsearch
-    Agrega campos de metadatos útiles
+    Serializa un DataFrame enriquecido directamente a NDJSON (una línea por log),
+    sin pasar por diccionarios. _meta es constante: se serializa una vez y se
+    añade al final de cada línea.
     """
     if df is None or len(df) == 0:
-        return []
-    
-    logs = df.to_dict(orient='records')
-    
-    # Enriquecer cada log con metadatos
-    for log in logs:
-        log['_meta'] = {
-            'tenant': tenant,
-            'namespace': namespace,
-            'loadbalancer': loadbalancer,
-            'log_type': log_type,
-            'ingested_at': datetime.utcnow().isoformat() + 'Z'
-        }
-        
-        # Asegurar que hay un @timestamp
-        # Buscar campos comunes de timestamp en los logs de F5
-        timestamp_fields = ['timestamp', 'time', 'date', 'req_time', 'start_time']
-        for field in timestamp_fields:
-            if field in log and log[field]:
-                try:
-                    # Si es epoch, convertir
-                    if isinstance(log[field], (int, float)):
-                        log['@timestamp'] = datetime.utcfromtimestamp(log[field]).isoformat() + 'Z'
-                    else:
-                        log['@timestamp'] = log[field]
-                    break
-                except:
-                    pass
-        
-        if '@timestamp' not in log:
-            log['@timestamp'] = datetime.utcnow().isoformat() + 'Z'
+        return b''
+    
+    if ingested_at is None:
+        ingested_at = _utc_now_iso()
+    
+    with timed("enrichment"):
+        enriched = _with_timestamp(df, ingested_at)
     
-    return logs
+    with timed("serialization"):
+        lines = enriched.to_json(orient='records', lines=True, force_ascii=False).encode('utf-8')
+        if not lines.endswith(b'\n'):
+            lines += b'\n'
+        
+        # Las líneas JSON no contienen saltos de línea sin escapar: "}\n" solo aparece al final de cada documento
+        meta = json.dumps(_meta_for(log_type, tenant, namespace, loadbalancer, ingested_at)).encode('utf-8')
+        return lines.replace(b'}\n', b',"_meta":' + meta + b'}\n')
 
 # ==========================================
 # ENDPOINTS DE GESTIÓN DE TOKENS (SIN CAMBIOS)
@@ -336,6 +557,7 @@ def create_or_update_tenant(tenant_token: TenantToken):
                     updated_at = CURRENT_TIMESTAMP
             """, (tenant_token.tenant, tenant_token.token))
             conn.commit()
+        invalidate_db_cache(tenant=tenant_token.tenant)
         
         return {
             "message": f"Token guardado para tenant: {tenant_token.tenant}",
@@ -397,6 +619,7 @@ def delete_tenant(tenant: str):
             
             if cursor.rowcount == 0:
                 raise HTTPException(status_code=404, detail=f"Tenant '{tenant}' no encontrado")
+        invalidate_db_cache(tenant=tenant)
         
         return {"message": f"Tenant '{tenant}' eliminado correctamente"}
     except HTTPException:
@@ -405,7 +628,11 @@ def delete_tenant(tenant: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 def get_token_for_tenant(tenant: str) -> str:
-    """Obtener el token asociado a un tenant."""
+    """Obtener el token asociado a un tenant (caché en memoria, ver invalidate_db_cache)."""
+    token = _token_cache.get(tenant)
+    if token is not None:
+        return token
+    
     with get_db() as conn:
         cursor = conn.execute("SELECT token FROM tenants WHERE tenant = ?", (tenant,))
         row = cursor.fetchone()
@@ -416,6 +643,7 @@ def get_token_for_tenant(tenant: str) -> str:
             detail=f"No se encontró token para el tenant '{tenant}'. Debe registrarlo primero en /api/tenants"
         )
     
+    _token_cache[tenant] = row['token']
     return row['token']
 
 # ==========================================
@@ -427,16 +655,10 @@ def get_elk_config():
     elk_url, headers, auth = get_elk_auth()
     
     # Determinar método de autenticación actual
-    with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT auth_method, 
-                   CASE WHEN api_key IS NOT NULL THEN substr(api_key, 1, 10) || '...' ELSE NULL END as api_key_preview
-            FROM elk_config WHERE id = 1
-        """)
-        row = cursor.fetchone()
+    row = load_elk_config()
     
     auth_method = row['auth_method'] if row else 'api_key'
-    has_api_key = row['api_key_preview'] is not None if row else False
+    has_api_key = row['api_key'] is not None if row else False
     
     return {
         "url": elk_url,
@@ -463,6 +685,7 @@ def update_elk_config(config: ElkConfig):
                     updated_at = CURRENT_TIMESTAMP
             """, (config.url, config.auth_method, config.api_key, config.username, config.password))
             conn.commit()
+        invalidate_db_cache(elk_config=True)
         
         return {
             "message": "Configuración de Elasticsearch actualizada",
@@ -472,15 +695,48 @@ def update_elk_config(config: ElkConfig):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/elk/watermarks")
+def list_elk_watermarks():
+    """Listar los watermarks del envío incremental a ELK."""
+    try:
+        with get_db() as conn:
+            cursor = conn.execute("""
+                SELECT tenant, namespace, loadbalancer, log_type, watermark, updated_at
+                FROM elk_watermarks
+                ORDER BY tenant, namespace, loadbalancer, log_type
+            """)
+            watermarks = [dict(row) for row in cursor.fetchall()]
+        
+        return {"watermarks": watermarks}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/elk/watermarks/{tenant}/{namespace}")
+def delete_elk_watermark(tenant: str, namespace: str, log_type: str = Query(...), loadbalancer: str = Query(None)):
+    """Reiniciar el envío incremental (el próximo envío usará la ventana de `hours`)."""
+    try:
+        with get_db() as conn:
+            cursor = conn.execute("""
+                DELETE FROM elk_watermarks
+                WHERE tenant = ? AND namespace = ? AND loadbalancer = ? AND log_type = ?
+            """, (tenant, namespace, loadbalancer or '', log_type))
+            conn.commit()
+            
+            if cursor.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Watermark no encontrado")
+        
+        return {"message": "Watermark eliminado correctamente"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/elk/test")
-def test_elk_connection():
+async def test_elk_connection():
     """Probar conexión a Elasticsearch"""
-    import urllib3
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-    
     try:
-        elk_url, headers, auth = get_elk_auth()
-        response = requests.get(elk_url, headers=headers, auth=auth, timeout=10, verify=False)
+        elk_url, headers, auth = await asyncio.to_thread(get_elk_auth)
+        response = await get_elk_client().get(elk_url, headers=headers, auth=auth, timeout=10)
         
         if response.status_code == 200:
             info = response.json()
@@ -502,7 +758,7 @@ def test_elk_connection():
                 "status_code": response.status_code,
                 "message": response.text[:200]
             }
-    except requests.exceptions.ConnectionError as e:
+    except httpx.TransportError as e:
         return {
             "status": "error",
             "message": f"No se puede conectar a {ELASTICSEARCH_CONFIG['url']}: {str(e)}"
@@ -516,36 +772,39 @@ def test_elk_connection():
 # ==========================================
 # ENDPOINTS PARA NAMESPACES Y LOAD BALANCERS
 # ==========================================
+# Los navegadores deben revalidar siempre (If-None-Match), el backend responde 304
+LISTING_CACHE_CONTROL = "private, no-cache"
+
+def listing_response(body: dict, entry: dict, if_none_match: Optional[str]) -> Response:
+    """Respuesta de un listado con ETag, o 304 si el navegador ya tiene esa versión"""
+    headers = {"ETag": entry["etag"], "Cache-Control": LISTING_CACHE_CONTROL}
+    if etag_matches(if_none_match, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    body["cached_at"] = datetime.fromtimestamp(entry["fetched_at"]).isoformat()
+    return JSONResponse(content=body, headers=headers)
+
 @app.get("/api/namespaces/{tenant}")
-def get_namespaces(tenant: str):
-    """Obtener lista de namespaces para un tenant específico."""
+async def get_namespaces(
+    tenant: str,
+    refresh: bool = Query(False, description="Ignorar la caché y consultar XC"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Obtener lista de namespaces para un tenant específico (caché por tenant, ver xc_listings)."""
     try:
-        token = get_token_for_tenant(tenant)
-        url = f"https://{tenant}.console.ves.volterra.io/api/web/namespaces"
-        headers = {
-            "Authorization": f"APIToken {token}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.get(url, headers=headers, timeout=30)
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Error al obtener namespaces: {response.text}"
-            )
+        token = await asyncio.to_thread(get_token_for_tenant, tenant)
+        entry = await get_listing_namespaces(tenant, token, refresh)
         
-        data = response.json()
-        namespaces = []
-        if "items" in data:
-            namespaces = [item.get("name", "") for item in data["items"] if "name" in item]
-        
-        return {
+        return listing_response({
             "tenant": tenant,
-            "namespaces": sorted(namespaces)
-        }
+            "namespaces": entry["value"]
+        }, entry, if_none_match)
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Error al obtener namespaces: {e.response.text}"
+        )
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error de conexión al obtener namespaces: {str(e)}"
@@ -556,40 +815,29 @@ def get_namespaces(tenant: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/loadbalancers/{tenant}/{namespace}")
-def get_loadbalancers(tenant: str, namespace: str):
-    """Obtener lista de load balancers para un tenant y namespace específicos."""
+async def get_loadbalancers(
+    tenant: str,
+    namespace: str,
+    refresh: bool = Query(False, description="Ignorar la caché y consultar XC"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Obtener lista de load balancers para un tenant y namespace específicos (caché por tenant)."""
     try:
-        token = get_token_for_tenant(tenant)
-        url = f"https://{tenant}.console.ves.volterra.io/api/config/namespaces/{namespace}/http_loadbalancers"
-        headers = {
-            "Authorization": f"APIToken {token}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.get(url, headers=headers, timeout=30)
+        token = await asyncio.to_thread(get_token_for_tenant, tenant)
+        entry = await get_listing_loadbalancers(tenant, token, namespace, refresh)
         
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Error al obtener load balancers: {response.text}"
-            )
-        
-        data = response.json()
-        loadbalancers = []
-        if "items" in data:
-            loadbalancers = [
-                item.get("name", "") 
-                for item in data["items"] 
-                if "name" in item
-            ]
-        
-        return {
+        return listing_response({
             "tenant": tenant,
             "namespace": namespace,
-            "loadbalancers": sorted(loadbalancers)
-        }
+            "loadbalancers": entry["value"]
+        }, entry, if_none_match)
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Error al obtener load balancers: {e.response.text}"
+        )
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error de conexión al obtener load balancers: {str(e)}"
@@ -599,15 +847,29 @@ def get_loadbalancers(tenant: str, namespace: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+DIAGNOSE_TIMEOUT_SECONDS = 10
+DIAGNOSE_WINDOW_SECONDS = 3600
+
 @app.get("/api/diagnose/{tenant}/{namespace}/{loadbalancer}")
-def diagnose_loadbalancer(tenant: str, namespace: str, loadbalancer: str):
-    """Diagnostica por qué un load balancer no retorna logs."""
+async def diagnose_loadbalancer(
+    tenant: str,
+    namespace: str,
+    loadbalancer: str,
+    early_exit: bool = Query(True, description="Cancelar las pruebas pendientes al encontrar una query de vh_name con logs")
+):
+    """
+    Diagnostica por qué un load balancer no retorna logs.
+    
+    Todas las pruebas (existencia del LB y variantes de query) se lanzan a la vez.
+    Con `early_exit` se cancelan las pendientes en cuanto una variante de vh_name
+    tiene logs y ya terminaron todas las de mayor prioridad (VH_NAME_PATTERNS va
+    en orden), para que una variante menos preferida no gane por responder antes.
+    La primera variante de vh_name con logs se recuerda para ese LB (también en
+    tenants.db, así que sobrevive a los reinicios) y la usan las descargas
+    siguientes (ver log_fetchers.remember_vh_name_pattern).
+    """
     try:
-        token = get_token_for_tenant(tenant)
-        headers = {
-            "Authorization": f"APIToken {token}",
-            "Content-Type": "application/json"
-        }
+        token = await asyncio.to_thread(get_token_for_tenant, tenant)
         
         results = {
             "loadbalancer": loadbalancer,
@@ -617,29 +879,23 @@ def diagnose_loadbalancer(tenant: str, namespace: str, loadbalancer: str):
         }
         
         # Test 1: Verificar que el LB existe
-        url = f"https://{tenant}.console.ves.volterra.io/api/config/namespaces/{namespace}/http_loadbalancers/{loadbalancer}"
-        response = requests.get(url, headers=headers, timeout=10)
-        
-        results["tests"].append({
-            "name": "Load Balancer Exists",
-            "status": "pass" if response.status_code == 200 else "fail",
-            "status_code": response.status_code,
-            "details": response.json() if response.status_code == 200 else response.text[:200]
-        })
+        async def lb_exists():
+            url = f"/api/config/namespaces/{namespace}/http_loadbalancers/{loadbalancer}"
+            response = await client.get(url, timeout=DIAGNOSE_TIMEOUT_SECONDS)
+            return {
+                "name": "Load Balancer Exists",
+                "status": "pass" if response.status_code == 200 else "fail",
+                "status_code": response.status_code,
+                "details": response.json() if response.status_code == 200 else response.text[:200]
+            }
         
-        # Test 2: Probar diferentes queries de logs
+        # Test 2: Probar diferentes queries de logs (una por patrón de vh_name y sin filtro)
         current_time = int(time.time())
-        start_time = current_time - 3600
-        
-        query_variants = [
-            f'{{vh_name="ves-io-http-loadbalancer-{loadbalancer}"}}',
-            f'{{vh_name="{loadbalancer}"}}',
-            f'{{vh_name="ves-io-https-loadbalancer-{loadbalancer}"}}',
-            ""
-        ]
+        start_time = current_time - DIAGNOSE_WINDOW_SECONDS
+        query_variants = [(pattern, f'{{vh_name="{pattern.format(lb=loadbalancer)}"}}')
+                          for pattern in VH_NAME_PATTERNS] + [(None, "")]
         
-        for query in query_variants:
-            url = f"https://{tenant}.console.ves.volterra.io/api/data/namespaces/{namespace}/access_logs"
+        async def query_test(query):
             payload = {
                 "namespace": namespace,
                 "query": query,
@@ -648,375 +904,543 @@ def diagnose_loadbalancer(tenant: str, namespace: str, loadbalancer: str):
                 "scroll": False,
                 "limit": 10
             }
-            
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = await client.post(f"/api/data/namespaces/{namespace}/access_logs", json=payload,
+                                         timeout=DIAGNOSE_TIMEOUT_SECONDS)
             
             log_count = 0
             if response.status_code == 200:
                 data = response.json()
                 log_count = len(data.get('logs', []))
             
-            results["tests"].append({
+            return {
                 "name": f"Query Test: {query if query else '(no filter)'}",
                 "status": "pass" if log_count > 0 else "no_data",
                 "status_code": response.status_code,
                 "logs_found": log_count,
                 "query": query
-            })
+            }
+        
+        async with xc_client_lease(tenant, token) as client:
+            probes = [asyncio.create_task(lb_exists())] + [
+                asyncio.create_task(query_test(query)) for _, query in query_variants
+            ]
+            patterns = [None] + [pattern for pattern, _ in query_variants]
+            names = ["Load Balancer Exists"] + [f"Query Test: {query if query else '(no filter)'}"
+                                                for _, query in query_variants]
+            found = None   # Índice de la primera variante de vh_name con logs
+        
+            t0 = time.time()
+            try:
+                pending = set(probes)
+                while pending:
+                    # Las variantes van de 1 a found - 1 por prioridad: hay que esperar a todas
+                    if early_exit and found is not None and not any(probes[i] in pending for i in range(1, found)):
+                        break
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        i = probes.index(task)
+                        if patterns[i] and not task.exception() and task.result()["logs_found"] > 0:
+                            found = i if found is None else min(found, i)
+            finally:
+                for task in probes:
+                    task.cancel()
+                await asyncio.gather(*probes, return_exceptions=True)
         
-        successful_queries = [t for t in results["tests"][1:] if t.get("logs_found", 0) > 0]
+        for i, task in enumerate(probes):
+            if task.cancelled():
+                results["tests"].append({"name": names[i], "status": "skipped"})
+            elif task.exception() is not None:
+                results["tests"].append({"name": names[i], "status": "error", "details": str(task.exception())})
+            else:
+                results["tests"].append(task.result())
+        results["took_ms"] = int((time.time() - t0) * 1000)
         
-        if successful_queries:
-            results["recommendation"] = f"Usa la query: {successful_queries[0]['query']}"
+        if found is not None:
+            remember_vh_name_pattern(tenant, namespace, loadbalancer, patterns[found])
+            await asyncio.to_thread(set_vh_name_pattern, tenant, namespace, loadbalancer, patterns[found])
+            results["recommendation"] = f"Usa la query: {query_variants[found - 1][1]}"
             results["status"] = "working"
+        elif any(t.get("logs_found", 0) > 0 for t in results["tests"][1:]):
+            results["recommendation"] = "Hay logs en el namespace pero ninguno coincide con el vh_name del load balancer. Verifica el nombre del LB"
+            results["status"] = "no_logs"
         else:
             results["recommendation"] = "El load balancer no tiene logs en la última hora. Verifica: 1) Tiene tráfico real, 2) Logging está habilitado, 3) Permisos del token"
             results["status"] = "no_logs"
+        results["query"] = log_query("access", loadbalancer, tenant=tenant, namespace=namespace)
         
         return results
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ==========================================
-# ENDPOINT PRINCIPAL: ENVIAR LOGS A ELK
+# FILTROS DE LAS CONSULTAS A XC
 # ==========================================
-@app.post("/api/logs/elk")
-def send_logs_to_elk(
-    log_type: str = Query(..., description="Tipo de log: access | audit | security"),
+def log_filters(
+    rsp_code_class: Optional[str] = Query(None, description="Filtro: clase de código de respuesta (1xx..5xx)"),
+    src_ip: Optional[str] = Query(None, description="Filtro: IP de origen"),
+    path_prefix: Optional[str] = Query(None, description="Filtro: prefijo del path"),
+    country: Optional[str] = Query(None, description="Filtro: país"),
+    method: Optional[str] = Query(None, description="Filtro: método HTTP")
+) -> Optional[Dict[str, str]]:
+    """Dependencia con los filtros indicados en la petición (None si no hay ninguno)"""
+    filters = {
+        "rsp_code_class": rsp_code_class,
+        "src_ip": src_ip,
+        "path_prefix": path_prefix,
+        "country": country,
+        "method": method,
+    }
+    return {name: value for name, value in filters.items() if value} or None
+
+# ==========================================
+# RESÚMENES (AGREGACIONES DE XC)
+# ==========================================
+@app.get("/api/aggregations")
+async def get_aggregations(
+    log_type: str = Query("access", description="Tipo de log: access | security"),
     tenant: str = Query(..., description="Nombre del tenant"),
     namespace: str = Query(...),
-    loadbalancer: str = Query(None),
-    hours: int = Query(24)
+    loadbalancer: str = Query(...),
+    hours: int = Query(24),
+    fields: Optional[str] = Query(None, description="Campos separados por coma (p. ej. rsp_code,country,src_ip)"),
+    topk: int = Query(10, description="Valores por campo"),
+    filters: Optional[Dict[str, str]] = Depends(log_filters)
 ):
     """
-    Obtiene logs de F5 XC y los envía directamente a Elasticsearch via Bulk API.
-    
-    Returns:
-        Estadísticas del envío a ELK
+    Resumen de la ventana calculado por XC en una sola consulta: top-k por
+    campo y un histograma de eventos por fecha, sin descargar los eventos.
+    Las respuestas se reutilizan durante un minuto (campo `cached`).
     """
     try:
-        start_time = time.time()
-        
-        # Obtener token
-        token = get_token_for_tenant(tenant)
-        
-        # Validar parámetros
-        if log_type in ["access", "security"] and not loadbalancer:
-            raise HTTPException(
-                status_code=400,
-                detail=f"El tipo de log '{log_type}' requiere especificar un load balancer"
-            )
-        
-        if log_type not in ELK_INDICES:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Tipo de log inválido. Valores permitidos: {list(ELK_INDICES.keys())}"
-            )
-        
-        print(f"[ELK] Iniciando: tenant={tenant}, type={log_type}, hours={hours}")
-        
-        # Obtener logs según el tipo
-        if log_type == "access":
-            df = fetch_access_logs(token, tenant, namespace, loadbalancer, hours)
-            logs = dataframe_to_logs(df, log_type, tenant, namespace, loadbalancer)
-        
-        elif log_type == "audit":
-            # Para audit logs, usar subprocess y convertir CSV a lista de dicts
-            csv_result = _get_logs_subprocess_raw(log_type, token, tenant, namespace, None, hours)
-            logs = csv_result if csv_result else []
-            # Agregar metadatos
-            for log in logs:
-                log['_meta'] = {
-                    'tenant': tenant,
-                    'namespace': namespace,
-                    'log_type': log_type,
-                    'ingested_at': datetime.utcnow().isoformat() + 'Z'
-                }
-        
-        elif log_type == "security":
-            # Para security logs, usar subprocess y convertir CSV a lista de dicts
-            csv_result = _get_logs_subprocess_raw(log_type, token, tenant, namespace, loadbalancer, hours)
-            logs = csv_result if csv_result else []
-            # Agregar metadatos
-            for log in logs:
-                log['_meta'] = {
-                    'tenant': tenant,
-                    'namespace': namespace,
-                    'loadbalancer': loadbalancer,
-                    'log_type': log_type,
-                    'ingested_at': datetime.utcnow().isoformat() + 'Z'
-                }
-        
-        fetch_time = time.time() - start_time
-        print(f"[ELK] Logs obtenidos en {fetch_time:.2f}s ({len(logs)} registros)")
-        
-        if not logs:
-            return {
-                "success": True,
-                "message": "No se encontraron logs para el período especificado",
-                "documents_sent": 0,
-                "tenant": tenant,
-                "log_type": log_type,
-                "index": ELK_INDICES[log_type]
-            }
-        
-        # Enviar a Elasticsearch
-        index_name = ELK_INDICES[log_type]
-        elk_result = send_to_elasticsearch_bulk(logs, index_name)
-        
-        total_time = time.time() - start_time
-        print(f"[ELK] Proceso completo en {total_time:.2f}s")
-        
-        return {
-            "success": elk_result["success"],
-            "message": elk_result["message"],
-            "documents_sent": elk_result["documents_sent"],
-            "errors": elk_result["errors"],
-            "tenant": tenant,
-            "namespace": namespace,
-            "loadbalancer": loadbalancer,
-            "log_type": log_type,
-            "index": index_name,
-            "fetch_time_seconds": round(fetch_time, 2),
-            "total_time_seconds": round(total_time, 2),
-            "took_ms": elk_result.get("took_ms", 0)
-        }
-    
+        token = await asyncio.to_thread(get_token_for_tenant, tenant)
+        field_list = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+        return await fetch_aggregations(log_type, token, tenant, namespace, loadbalancer, hours, field_list, topk,
+                                        filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Error de la API de XC al calcular agregaciones: {e.response.text[:500]}"
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Error de conexión al calcular agregaciones: {str(e)}")
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
+        raise _internal_error(e)
+
+# ==========================================
+# EXPORTACIONES: ELK Y CSV
+# ==========================================
+def validate_export(log_type: str, loadbalancer: Optional[str], id_mode: str = "none",
+                    format: str = DEFAULT_FORMAT, filters: Optional[Dict[str, str]] = None,
+                    incremental: bool = False):
+    """Valida los parámetros de una exportación (HTTPException 400 si no son válidos)"""
+    if log_type not in ELK_INDICES:
         raise HTTPException(
-            status_code=500,
-            detail={
-                "error": str(e),
-                "traceback": traceback.format_exc()
-            }
+            status_code=400,
+            detail=f"Tipo de log inválido. Valores permitidos: {list(ELK_INDICES.keys())}"
         )
+    
+    if log_type in ["access", "security"] and not loadbalancer:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El tipo de log '{log_type}' requiere especificar un load balancer"
+        )
+    
+    if id_mode not in ID_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"id_mode inválido. Valores permitidos: {list(ID_MODES)}"
+        )
+    
+    try:
+        check_format(format)
+        normalize_filters(log_type, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if incremental and filters:
+        # El watermark es de la fuente completa: un envío filtrado no puede avanzarlo
+        raise HTTPException(status_code=400, detail="El modo incremental no admite filtros")
 
-def _get_logs_subprocess_raw(log_type: str, token: str, tenant: str, namespace: str, loadbalancer: str, hours: int) -> List[Dict]:
+async def export_logs_to_elk(log_type: str, tenant: str, namespace: str, loadbalancer: Optional[str], hours: int,
+                             incremental: bool = False, id_mode: str = "create",
+                             filters: Optional[Dict[str, str]] = None,
+                             progress: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
-    Obtiene logs usando subprocess y retorna como lista de diccionarios.
-    Para audit y security logs que aún usan scripts externos.
+    Obtiene logs de F5 XC y los envía a Elasticsearch (ver send_logs_to_elk).
+    Si se indica `progress` se actualiza con el avance del fetch y del envío.
+    El resultado incluye el desglose de tiempos por etapa (`timings`, ver timings.py).
     """
-    import csv
-    import io
+    start_time = time.time()
+    timings = start_timings("elk", tenant=tenant, namespace=namespace, loadbalancer=loadbalancer,
+                            log_type=log_type)
+    token = await asyncio.to_thread(get_token_for_tenant, tenant)
+    
+    if log_type == "audit":
+        loadbalancer = None
+    
+    window_end = int(time.time())
+    window_start = window_end - hours * 3600
+    watermark = (await asyncio.to_thread(get_elk_watermark, tenant, namespace, loadbalancer, log_type)
+                 if incremental else None)
+    if watermark is not None:
+        window_start = min(watermark - ELK_INCREMENTAL_OVERLAP_SECONDS, window_end)
+    
+    print(f"[ELK] Iniciando: tenant={tenant}, type={log_type}, hours={hours}"
+          + (f", filtros={filters}" if filters else "")
+          + (f", incremental desde {datetime.fromtimestamp(window_start)}" if watermark is not None else ""))
+    
+    # Fetch y envío en paralelo: cada página descargada pasa por una cola
+    # acotada hacia el envío Bulk, sin materializar la ventana completa
+    index_name = ELK_INDICES[log_type]
+    elk_result = await stream_to_elasticsearch(log_type, token, tenant, namespace, loadbalancer, hours, index_name,
+                                               window=(window_start, window_end), id_mode=id_mode,
+                                               progress=progress, filters=filters)
     
-    scripts = {
-        "access": "f5-xc-export-access-logs.py",
-        "audit": "f5-xc-export-audit-logs.py",
-        "security": "f5-xc-export-security-event-logs.py"
+    fetch_time = elk_result["fetch_time_seconds"]
+    print(f"[ELK] Logs obtenidos en {fetch_time:.2f}s ({elk_result['documents_fetched']} registros)")
+    
+    # Con eventos truncados la ventana no quedó completa: el watermark no avanza
+    if incremental and elk_result["success"] and not elk_result["errors"] and not elk_result["truncated_events"]:
+        await asyncio.to_thread(set_elk_watermark, tenant, namespace, loadbalancer, log_type, window_end)
+    
+    incremental_info = {
+        "incremental": incremental,
+        "window_start": window_start,
+        "window_end": window_end,
+        "watermark": (await asyncio.to_thread(get_elk_watermark, tenant, namespace, loadbalancer, log_type)
+                      if incremental else None)
     }
     
-    script = os.path.join(os.getcwd(), scripts[log_type])
+    if elk_result["documents_fetched"] == 0:
+        return {
+            "success": True,
+            "message": "No se encontraron logs para el período especificado",
+            "documents_sent": 0,
+            "truncated_events": elk_result["truncated_events"],
+            "tenant": tenant,
+            "log_type": log_type,
+            "index": index_name,
+            "timings": log_timings(timings, index=index_name, records=0),
+            **incremental_info
+        }
+    
+    total_time = time.time() - start_time
+    print(f"[ELK] Proceso completo en {total_time:.2f}s")
+    
+    return {
+        "success": elk_result["success"],
+        "message": elk_result["message"],
+        "documents_sent": elk_result["documents_sent"],
+        "errors": elk_result["errors"],
+        "duplicates": elk_result["duplicates"],
+        "tenant": tenant,
+        "namespace": namespace,
+        "loadbalancer": loadbalancer,
+        "log_type": log_type,
+        "index": index_name,
+        "documents_fetched": elk_result["documents_fetched"],
+        "truncated_events": elk_result["truncated_events"],
+        "fetch_time_seconds": round(fetch_time, 2),
+        "total_time_seconds": round(total_time, 2),
+        "took_ms": elk_result.get("took_ms", 0),
+        "throughput": elk_result.get("throughput"),
+        "timings": log_timings(timings, index=index_name, records=elk_result["documents_fetched"]),
+        **incremental_info
+    }
+
+async def export_logs_to_file(log_type: str, tenant: str, namespace: str, loadbalancer: Optional[str], hours: int,
+                              format: str = DEFAULT_FORMAT, filters: Optional[Dict[str, str]] = None,
+                              progress: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Obtiene logs de F5 XC y genera el archivo en LOG_DIR con el formato indicado (ver get_logs).
+    El resultado incluye el desglose de tiempos por etapa (`timings`, ver timings.py).
+    """
+    start_time = time.time()
+    timings = start_timings("file", tenant=tenant, namespace=namespace, loadbalancer=loadbalancer,
+                            log_type=log_type, format=format)
+    progress = {} if progress is None else progress
+    token = await asyncio.to_thread(get_token_for_tenant, tenant)
     
-    if not os.path.exists(script):
-        print(f"[WARNING] Script no encontrado: {script}")
-        return []
+    print(f"[API] Iniciando descarga: tenant={tenant}, type={log_type}, hours={hours}, format={format}"
+          + (f", filtros={filters}" if filters else ""))
     
-    files_before = set(glob.glob(f"{LOG_DIR}/*.csv"))
-    files_before_cwd = set(glob.glob(f"{os.getcwd()}/*.csv"))
+    df = await fetch_logs(log_type, token, tenant, namespace, loadbalancer, hours, progress=progress, filters=filters)
     
-    cmd = [
-        "python3",
-        script,
-        "--token", token,
-        "--tenant", tenant,
-        "--namespace", namespace,
-        "--hours", str(hours)
-    ]
+    fetch_time = time.time() - start_time
+    print(f"[API] Logs descargados en {fetch_time:.2f}s ({len(df)} registros)")
     
-    if log_type in ["access", "security"] and loadbalancer:
-        cmd.extend(["--loadbalancer", loadbalancer])
+    current_date = datetime.now().strftime("%m-%d-%Y")
+    suffix = "-filtered" if filters else ""
+    filename = f"f5-xc-{log_type}_logs-{tenant}_{namespace}-{current_date}{suffix}{file_extension(format)}"
+    file_path = os.path.join(LOG_DIR, filename)
     
-    print(f"[DEBUG] Ejecutando: {' '.join(cmd[:6])}...")
+    with timed("serialization"):
+        await asyncio.to_thread(write_dataframe, df, file_path, format)
     
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    total_time = time.time() - start_time
+    print(f"[API] Proceso completo en {total_time:.2f}s")
     
-    if result.returncode != 0:
-        print(f"[ERROR] Script falló: {result.stderr}")
-        return []
+    return {
+        "message": f"Archivo generado correctamente: {filename}",
+        "file": filename,
+        "tenant": tenant,
+        "log_type": log_type,
+        "format": format,
+        "filters": filters,
+        "records": len(df),
+        "truncated_events": progress.get("truncated_events", 0),
+        "fetch_time_seconds": round(fetch_time, 2),
+        "total_time_seconds": round(total_time, 2),
+        "timings": log_timings(timings, records=len(df), bytes_written=os.path.getsize(file_path))
+    }
+
+async def stream_logs_csv(log_type: str, tenant: str, namespace: str, loadbalancer: Optional[str], hours: int,
+                          compress: bool = False, filters: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """
+    Descarga CSV en streaming: cada página de XC se convierte a filas CSV y se
+    escribe en la respuesta en cuanto llega (comprimida con gzip si `compress`),
+    sin generar el archivo en LOG_DIR ni acumular la ventana en memoria.
     
-    time.sleep(1)
+    El generador de páginas se crea y se cierra dentro del cuerpo de la
+    respuesta: si el cliente se desconecta, el fetch de XC se cancela con él.
+    Los errores de XC llegan con la respuesta ya iniciada y dejan el archivo
+    truncado (se registran en el log). Entre ventanas de tiempo las filas no
+    quedan en orden estricto.
+    """
+    token = await asyncio.to_thread(get_token_for_tenant, tenant)
+    print(f"[API] Descarga en streaming: tenant={tenant}, type={log_type}, hours={hours}, gzip={compress}")
+    timings = start_timings("csv_stream", tenant=tenant, namespace=namespace, loadbalancer=loadbalancer,
+                            log_type=log_type, gzip=compress)
     
-    # Buscar archivo generado
-    files_after = set(glob.glob(f"{LOG_DIR}/*.csv"))
-    files_after_cwd = set(glob.glob(f"{os.getcwd()}/*.csv"))
-    new_files = (files_after - files_before) | (files_after_cwd - files_before_cwd)
+    columns = LOG_COLUMNS[log_type]
     
-    if new_files:
-        latest_file = max(new_files, key=os.path.getctime)
+    async def body():
+        start_time = time.time()
+        rows = 0
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
         
-        # Leer CSV y convertir a lista de dicts
-        logs = []
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                logs.append(dict(row))
+        def encode(chunk: bytes) -> bytes:
+            # Z_SYNC_FLUSH: cada página sale comprimida sin esperar al final
+            if compressor is None:
+                return chunk
+            return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
         
-        # Eliminar archivo temporal
-        os.remove(latest_file)
+        def page_to_csv(page) -> bytes:
+            with timed("serialization"):
+                return pd.DataFrame(page, columns=columns).to_csv(index=False, header=False).encode('utf-8')
         
-        return logs
+        pages = iter_log_pages(log_type, token, tenant, namespace, loadbalancer, hours, filters=filters)
+        try:
+            async with aclosing(pages):
+                yield encode(pd.DataFrame(columns=columns).to_csv(index=False).encode('utf-8'))
+                async for page in pages:
+                    rows += len(page['Time'])
+                    yield encode(await asyncio.to_thread(page_to_csv, page))
+            if compressor is not None:
+                yield compressor.flush()
+        except Exception as e:
+            # Con la respuesta ya iniciada no se puede cambiar el código HTTP: el archivo queda truncado
+            print(f"[API ERROR] Descarga en streaming interrumpida tras {rows} registros: {str(e)}")
+            raise
+        print(f"[API] Streaming completo: {rows} registros en {time.time() - start_time:.2f}s")
+        log_timings(timings, records=rows)
+    
+    current_date = datetime.now().strftime("%m-%d-%Y")
+    suffix = "-filtered" if filters else ""
+    filename = f"f5-xc-{log_type}_logs-{tenant}_{namespace}-{current_date}{suffix}.csv" + (".gz" if compress else "")
+    return StreamingResponse(
+        body(),
+        media_type="application/gzip" if compress else "text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def _internal_error(e: Exception) -> HTTPException:
+    import traceback
+    return HTTPException(
+        status_code=500,
+        detail={
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+    )
+
+# ==========================================
+# ENDPOINT PRINCIPAL: ENVIAR LOGS A ELK
+# ==========================================
+@app.post("/api/logs/elk")
+async def send_logs_to_elk(
+    log_type: str = Query(..., description="Tipo de log: access | audit | security"),
+    tenant: str = Query(..., description="Nombre del tenant"),
+    namespace: str = Query(...),
+    loadbalancer: str = Query(None),
+    hours: int = Query(24),
+    incremental: bool = Query(False, description="Solo eventos nuevos desde el último envío completo"),
+    id_mode: str = Query("create", description="_id de los documentos: none | create | index"),
+    filters: Optional[Dict[str, str]] = Depends(log_filters)
+):
+    """
+    Obtiene logs de F5 XC y los envía directamente a Elasticsearch via Bulk API.
+    Para ventanas grandes usar POST /api/jobs (no mantiene la petición abierta).
+    
+    En modo incremental la ventana empieza en el watermark guardado para
+    (tenant, namespace, LB, tipo de log), con un pequeño solapamiento; si aún no
+    hay watermark se usan las últimas `hours` horas. El watermark avanza hasta el
+    final de la ventana solo si el envío terminó sin errores.
+    
+    Con id_mode "create" (por defecto) o "index" cada documento lleva un _id
+    estable, así que los solapamientos y reenvíos no duplican documentos.
     
-    return []
+    Los filtros opcionales se aplican en la query de XC (no con incremental).
+    
+    Returns:
+        Estadísticas del envío a ELK
+    """
+    try:
+        validate_export(log_type, loadbalancer, id_mode, filters=filters, incremental=incremental)
+        return await export_logs_to_elk(log_type, tenant, namespace, loadbalancer, hours, incremental, id_mode,
+                                        filters)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _internal_error(e)
 
 # ==========================================
 # ENDPOINT ORIGINAL: DESCARGAR CSV (MANTENIDO)
 # ==========================================
 @app.get("/api/logs")
-def get_logs(
+async def get_logs(
     log_type: str = Query(..., description="Tipo de log: access | audit | security"),
     tenant: str = Query(..., description="Nombre del tenant"),
     namespace: str = Query(...),
     loadbalancer: str = Query(None),
-    hours: int = Query(24)
+    hours: int = Query(24),
+    stream: bool = Query(False, description="Enviar el CSV directamente en la respuesta, página a página"),
+    gzip: bool = Query(False, description="Comprimir el CSV en streaming (.csv.gz)"),
+    format: str = Query(DEFAULT_FORMAT, description="Formato: csv | csv.gz | parquet | ndjson.gz | ndjson.zst"),
+    filters: Optional[Dict[str, str]] = Depends(log_filters)
 ):
     """
-    Genera archivo CSV para descarga.
+    Genera el archivo para descarga (CSV por defecto; Parquet o NDJSON para
+    recargarlo más rápido en pandas).
+    Para ventanas grandes usar POST /api/jobs (no mantiene la petición abierta)
+    o stream=true (el CSV se descarga a medida que llegan las páginas; solo
+    formatos csv y csv.gz).
+    
+    Los filtros opcionales (rsp_code_class, src_ip, path_prefix, country,
+    method) se agregan a la query de XC, así que solo se descargan los eventos
+    que los cumplen. Las consultas con filtros no usan la caché horaria.
     """
     try:
-        start_time = time.time()
-        
-        # Obtener token
-        token = get_token_for_tenant(tenant)
-        
-        # Validar parámetros
-        if log_type in ["access", "security"] and not loadbalancer:
-            raise HTTPException(
-                status_code=400,
-                detail=f"El tipo de log '{log_type}' requiere especificar un load balancer"
-            )
-        
-        print(f"[API] Iniciando descarga: tenant={tenant}, type={log_type}, hours={hours}")
-        
-        # NUEVA LÓGICA: Llamada directa (sin subprocess) para access logs
-        if log_type == "access":
-            df = fetch_access_logs(token, tenant, namespace, loadbalancer, hours)
-            
-            fetch_time = time.time() - start_time
-            print(f"[API] Logs descargados en {fetch_time:.2f}s ({len(df)} registros)")
-            
-            current_date = datetime.now().strftime("%m-%d-%Y")
-            filename = f"f5-xc-{log_type}_logs-{tenant}_{namespace}-{current_date}.csv"
-            file_path = os.path.join(LOG_DIR, filename)
-            
-            df.to_csv(file_path, index=False, encoding='utf-8')
-            
-            total_time = time.time() - start_time
-            print(f"[API] Proceso completo en {total_time:.2f}s")
-            
-            return {
-                "message": f"Archivo generado correctamente: {filename}",
-                "file": filename,
-                "tenant": tenant,
-                "log_type": log_type,
-                "records": len(df),
-                "fetch_time_seconds": round(fetch_time, 2),
-                "total_time_seconds": round(total_time, 2)
-            }
-        
-        elif log_type == "audit":
-            print(f"[API] Usando subprocess para audit logs")
-            return _get_logs_subprocess(log_type, token, tenant, namespace, loadbalancer, hours)
-        
-        elif log_type == "security":
-            print(f"[API] Usando subprocess para security logs")
-            return _get_logs_subprocess(log_type, token, tenant, namespace, loadbalancer, hours)
-        
-        else:
-            raise HTTPException(status_code=400, detail="Tipo de log no válido")
-    
+        validate_export(log_type, loadbalancer, format=format, filters=filters)
+        if stream:
+            if format not in ("csv", "csv.gz"):
+                raise HTTPException(status_code=400, detail="stream=true solo admite los formatos csv y csv.gz")
+            return await stream_logs_csv(log_type, tenant, namespace, loadbalancer, hours, gzip or format == "csv.gz",
+                                         filters)
+        return await export_logs_to_file(log_type, tenant, namespace, loadbalancer, hours, format, filters)
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": str(e),
-                "traceback": traceback.format_exc()
-            }
-        )
+        raise _internal_error(e)
 
-def _get_logs_subprocess(log_type: str, token: str, tenant: str, namespace: str, loadbalancer: str, hours: int):
+# ==========================================
+# TRABAJOS EN SEGUNDO PLANO
+# ==========================================
+# Exportación que ejecuta cada tipo de trabajo
+JOB_KINDS = {
+    "csv": export_logs_to_file,     # Archivo en LOG_DIR (CSV u otro formato)
+    "elk": export_logs_to_elk,
+}
+
+@app.post("/api/jobs")
+async def create_job(request: JobRequest):
     """
-    Función helper para llamadas con subprocess (audit y security logs)
-    Mantiene la lógica original para tipos que aún no están optimizados.
-    Genera archivo CSV.
+    Crea un trabajo de exportación (kind "csv" o "elk") y retorna su ID sin
+    esperar a que termine. Si ya hay un trabajo activo con los mismos
+    parámetros se retorna ese.
     """
-    scripts = {
-        "access": "f5-xc-export-access-logs.py",
-        "audit": "f5-xc-export-audit-logs.py",
-        "security": "f5-xc-export-security-event-logs.py"
-    }
-    
-    script = os.path.join(os.getcwd(), scripts[log_type])
-    
-    if not os.path.exists(script):
-        raise HTTPException(status_code=500, detail=f"Script no encontrado: {script}")
-    
-    files_before = set(glob.glob(f"{LOG_DIR}/*.csv"))
-    files_before_cwd = set(glob.glob(f"{os.getcwd()}/*.csv"))
-    
-    cmd = [
-        "python3",
-        script,
-        "--token", token,
-        "--tenant", tenant,
-        "--namespace", namespace,
-        "--hours", str(hours)
-    ]
-    
-    if log_type in ["access", "security"]:
-        cmd.extend(["--loadbalancer", loadbalancer])
-    
-    print(f"[DEBUG] Ejecutando: {' '.join(cmd)}")
-    
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Tipo de trabajo inválido. Valores permitidos: {list(JOB_KINDS)}")
+    filters = {name: value for name, value in (request.filters or {}).items() if value} or None
+    validate_export(request.log_type, request.loadbalancer,
+                    request.id_mode if request.kind == "elk" else "none",
+                    request.format if request.kind == "csv" else DEFAULT_FORMAT,
+                    filters, request.incremental if request.kind == "elk" else False)
+    await asyncio.to_thread(get_token_for_tenant, request.tenant)
     
-    if result.returncode != 0:
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "Error ejecutando script",
-                "stderr": result.stderr,
-                "stdout": result.stdout
-            }
-        )
-    
-    time.sleep(1)
+    params = {
+        "log_type": request.log_type,
+        "tenant": request.tenant,
+        "namespace": request.namespace,
+        "loadbalancer": request.loadbalancer if request.log_type != "audit" else None,
+        "hours": request.hours,
+        "filters": filters,
+    }
+    if request.kind == "elk":
+        params["incremental"] = request.incremental
+        params["id_mode"] = request.id_mode
+    else:
+        params["format"] = request.format
     
-    files_after = set(glob.glob(f"{LOG_DIR}/*.csv"))
-    files_after_cwd = set(glob.glob(f"{os.getcwd()}/*.csv"))
-    new_files = (files_after - files_before) | (files_after_cwd - files_before_cwd)
+    export = JOB_KINDS[request.kind]
+    job, created = get_job_manager().submit(request.kind, params, lambda progress: export(**params, progress=progress))
+    return {"job_id": job.id, "status": job.status, "created": created}
+
+@app.get("/api/jobs")
+def list_jobs():
+    """Listar los trabajos activos y los terminados recientemente"""
+    return {"jobs": [job.to_dict() for job in get_job_manager().list()]}
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """Estado, avance y resultado de un trabajo"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo '{job_id}' no encontrado")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Avance de un trabajo como Server-Sent Events: un evento "progress" cada
+    medio segundo (páginas, documentos descargados/indexados, lotes Bulk
+    confirmados, docs/s actuales y promedio) y un evento "done" al terminar.
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo '{job_id}' no encontrado")
     
-    if new_files:
-        latest_file = max(new_files, key=os.path.getctime)
-        filename = os.path.basename(latest_file)
-        
-        if os.path.dirname(latest_file) == os.getcwd():
-            import shutil
-            dest_file = os.path.join(LOG_DIR, filename)
-            shutil.move(latest_file, dest_file)
-        
-        return {
-            "message": f"Archivo generado correctamente: {filename}",
-            "file": filename,
-            "tenant": tenant,
-            "log_type": log_type
-        }
+    async def event_stream():
+        async for event, data in iter_job_events(job):
+            yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
     
-    raise HTTPException(
-        status_code=500,
-        detail="No se encontró el archivo generado"
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancelar un trabajo en cola o en ejecución"""
+    manager = get_job_manager()
+    if manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo '{job_id}' no encontrado")
+    if not manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"El trabajo '{job_id}' ya terminó")
+    return {"message": f"Trabajo '{job_id}' cancelado"}
+
 @app.get("/api/download")
 def download_log(file: str):
     """
-    Permite descargar el archivo CSV generado.
+    Permite descargar el archivo generado, con el media type de su formato.
     Solo acepta nombres de archivo (sin rutas) por seguridad.
     """
     filename = os.path.basename(file)
@@ -1026,7 +1450,7 @@ def download_log(file: str):
         return FileResponse(
             file_path, 
             filename=filename,
-            media_type='text/csv'
+            media_type=media_type_for(filename)
         )
     else:
         raise HTTPException(
@@ -1040,25 +1464,51 @@ def download_log(file: str):
 # ==========================================
 # ENDPOINT DE SALUD
 # ==========================================
-@app.get("/api/health")
-def health_check():
-    """Verificar estado del servicio"""
+@app.get("/metrics")
+async def metrics():
+    """Métricas en formato de texto de Prometheus (ver metrics.py)"""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+def health_probes():
+    """Sondas del health checker: Elasticsearch y la API de XC de cada tenant registrado"""
     elk_url, headers, auth = get_elk_auth()
     
-    # Test ELK connection
-    elk_status = "unknown"
-    try:
-        response = requests.get(elk_url, headers=headers, auth=auth, timeout=5, verify=False)
-        elk_status = "connected" if response.status_code == 200 else f"error_{response.status_code}"
-    except:
-        elk_status = "disconnected"
+    async def probe_elk():
+        return await get_elk_client().get(elk_url, headers=headers, auth=auth)
+    
+    probes = {"elasticsearch": (probe_elk, {"url": elk_url}, None)}
+    
+    with get_db() as conn:
+        tenants = conn.execute("SELECT tenant, token FROM tenants ORDER BY tenant").fetchall()
+    
+    for row in tenants:
+        async def probe_xc(tenant=row['tenant'], token=row['token']):
+            async with xc_client_lease(tenant, token) as client:
+                return await client.get("/api/web/namespaces")
+        
+        # Cada petición a XC consume cuota del tenant: intervalo largo
+        probes[f"xc:{row['tenant']}"] = (probe_xc, {"url": xc_base_url(row['tenant'])},
+                                         HEALTH_CHECK_SLOW_INTERVAL_SECONDS)
+    return probes
+
+@app.get("/api/health")
+async def health_check():
+    """
+    Verificar estado del servicio.
+    
+    Responde al instante con el último estado de Elasticsearch y de XC que
+    calculó el health checker en segundo plano (ver health.py). La API de XC
+    se comprueba con menos frecuencia (`check_interval_seconds` de cada tenant).
+    """
+    checker = get_health_checker()
+    targets = checker.snapshot()
     
     return {
         "status": "running",
         "timestamp": datetime.utcnow().isoformat() + 'Z',
-        "elasticsearch": {
-            "url": elk_url,
-            "status": elk_status
-        },
+        "last_check": datetime.utcfromtimestamp(checker.last_check).isoformat() + 'Z' if checker.last_check else None,
+        "check_interval_seconds": checker.interval,
+        "elasticsearch": targets.get("elasticsearch", {"status": "unknown"}),
+        "xc": {name.split(":", 1)[1]: target for name, target in targets.items() if name.startswith("xc:")},
         "indices": ELK_INDICES
     }
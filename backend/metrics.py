@@ -0,0 +1,222 @@
+# metrics.py
+"""
+Métricas del backend en formato de texto de Prometheus (GET /metrics).
+
+Si prometheus_client está instalado se usan sus contadores, gauges e
+histogramas (en un registro propio de la aplicación). Si no, un registro
+mínimo sin dependencias con la misma interfaz
+(`METRIC.labels(tenant=..., log_type=...).observe(segundos)`) y el mismo
+formato de texto. En ambos casos los valores se guardan en memoria del
+proceso y son seguros entre hilos.
+
+Las métricas de los caminos críticos (peticiones a XC, parseo de páginas,
+Bulk de Elasticsearch y trabajos) se definen al final del módulo.
+"""
+import abc
+import bisect
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import prometheus_client
+except ImportError:  # prometheus_client es opcional
+    prometheus_client = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+EVENTS_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BYTES_BUCKETS = (1024, 16384, 65536, 262144, 1048576, 4194304, 8388608, 16777216, 33554432)
+
+_registry: List["_Metric"] = []
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        _registry.append(self)
+
+    def labels(self, **labels):
+        """Serie de la métrica para esos valores de etiquetas (se crea la primera vez)"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} requiere las etiquetas {self.labelnames}")
+        key = tuple(str(labels[name]) if labels[name] is not None else "" for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Serie nueva (valor o histograma) para una combinación de etiquetas"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in sorted(children):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+class _HistogramValue:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # El último es +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, key):
+        with self._lock:
+            counts = list(self.counts)
+            total_sum = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total_sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+if prometheus_client is not None:
+    _prometheus_registry = prometheus_client.CollectorRegistry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()):
+    if prometheus_client is not None:
+        return prometheus_client.Counter(name, documentation, labelnames, registry=_prometheus_registry)
+    return Counter(name, documentation, labelnames)
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()):
+    if prometheus_client is not None:
+        return prometheus_client.Gauge(name, documentation, labelnames, registry=_prometheus_registry)
+    return Gauge(name, documentation, labelnames)
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS):
+    if prometheus_client is not None:
+        return prometheus_client.Histogram(name, documentation, labelnames, registry=_prometheus_registry,
+                                           buckets=buckets)
+    return Histogram(name, documentation, labelnames, buckets)
+
+def render_metrics() -> str:
+    """Todas las métricas registradas en formato de texto de Prometheus"""
+    if prometheus_client is not None:
+        return prometheus_client.generate_latest(_prometheus_registry).decode('utf-8')
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ==========================================
+# MÉTRICAS DE LOS CAMINOS CRÍTICOS
+# ==========================================
+# Peticiones de logs a XC: request = "first_page" (consulta inicial) o "scroll"
+XC_REQUEST_SECONDS = histogram(
+    "f5xc_xc_request_duration_seconds", "Latencia de las peticiones de logs a la API de XC",
+    ("tenant", "log_type", "request"))
+XC_REQUEST_ERRORS = counter(
+    "f5xc_xc_request_errors_total", "Peticiones de logs a XC fallidas (status HTTP o 'connection')",
+    ("tenant", "log_type", "request", "status"))
+XC_PAGE_EVENTS = histogram(
+    "f5xc_xc_page_events", "Eventos por página de logs recibida de XC",
+    ("tenant", "log_type"), EVENTS_BUCKETS)
+XC_PAGE_PARSE_SECONDS = histogram(
+    "f5xc_xc_page_parse_duration_seconds", "Tiempo de parseo de una página de logs al buffer columnar",
+    ("tenant", "log_type"), PARSE_BUCKETS)
+XC_TRUNCATED_EVENTS = counter(
+    "f5xc_xc_truncated_events_total", "Eventos informados por XC (total_hits) que no se recibieron",
+    ("tenant", "log_type"))
+
+# Bulk API de Elasticsearch
+ELK_BULK_SECONDS = histogram(
+    "f5xc_elk_bulk_request_duration_seconds", "Latencia de las peticiones Bulk a Elasticsearch",
+    ("tenant", "log_type", "index"))
+ELK_BULK_BYTES = histogram(
+    "f5xc_elk_bulk_request_bytes", "Tamaño del cuerpo de las peticiones Bulk",
+    ("tenant", "log_type", "index"), BYTES_BUCKETS)
+ELK_BULK_REQUEST_ERRORS = counter(
+    "f5xc_elk_bulk_request_errors_total", "Peticiones Bulk fallidas completas (status HTTP o 'connection')",
+    ("tenant", "log_type", "index", "status"))
+ELK_BULK_DOCUMENTS = counter(
+    "f5xc_elk_bulk_documents_total", "Documentos procesados por Bulk según resultado (indexed, duplicate, error)",
+    ("tenant", "log_type", "index", "result"))
+ELK_BULK_ITEM_ERRORS = counter(
+    "f5xc_elk_bulk_item_errors_total", "Items con error en respuestas Bulk, por status del item (incluye reintentables)",
+    ("tenant", "log_type", "index", "status"))
+
+# Trabajos en segundo plano
+JOBS_ACTIVE = gauge(
+    "f5xc_jobs_active", "Trabajos en cola o en ejecución", ("kind", "state"))
+JOBS_FINISHED = counter(
+    "f5xc_jobs_finished_total", "Trabajos terminados por estado final", ("kind", "status"))
@@ -0,0 +1,111 @@
+# timings.py
+"""
+Desglose de tiempos por petición de exportación.
+
+start_timings() crea un RequestTimings y lo deja como el actual de la tarea
+(contextvars): las tareas y hilos (asyncio.to_thread) que se lancen después
+lo heredan, así que las funciones del camino crítico (log_fetchers, main)
+solo llaman a add_time / add_counts sin recibirlo como parámetro. Sin
+RequestTimings actual (p. ej. scripts CLI) no hacen nada.
+
+Cada etapa acumula el tiempo de todas las tareas que la ejecutan: con varios
+workers en paralelo la suma puede superar el tiempo total, y lo que interesa
+es qué etapa domina.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Etapas del desglose, en el orden del camino de los datos
+STAGES = (
+    "network_wait",      # Esperando respuestas de la API de XC
+    "json_parse",        # JSON de las páginas y proyección de los eventos a columnas
+    "dataframe_build",   # Construcción de DataFrames
+    "enrichment",        # @timestamp y _meta para Elasticsearch
+    "serialization",     # CSV / Parquet / NDJSON
+    "bulk_wait",         # Esperando a la Bulk API (lotes en vuelo llenos o cierre)
+)
+
+class RequestTimings:
+    """Segundos por etapa y contadores (páginas, bytes) de una exportación"""
+
+    def __init__(self, operation: str, **fields):
+        self.operation = operation
+        self.fields = fields
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self.counters: Dict[str, int] = {
+            "xc_requests": 0,
+            "pages": 0,
+            "bytes_received": 0,
+            "cached_hours": 0,
+            "bulk_batches": 0,
+            "bytes_sent": 0,
+        }
+        self._lock = threading.Lock()
+
+    def add_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_counts(self, **counters: int):
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = time.perf_counter() - self.started_at
+        with self._lock:
+            return {
+                "total_seconds": round(total, 3),
+                "stages_seconds": {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+                **self.counters,
+            }
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def start_timings(operation: str, **fields) -> RequestTimings:
+    """Nuevo desglose para la tarea actual (cada petición y cada trabajo corren en su propia tarea)"""
+    timings = RequestTimings(operation, **fields)
+    _current.set(timings)
+    return timings
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+def add_time(stage: str, seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add_time(stage, seconds)
+
+def add_counts(**counters: int):
+    timings = _current.get()
+    if timings is not None:
+        timings.add_counts(**counters)
+
+@contextmanager
+def timed(stage: str):
+    """Suma al desglose actual el tiempo del bloque"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(stage, time.perf_counter() - t0)
+
+def log_timings(timings: RequestTimings, **fields) -> Dict[str, Any]:
+    """Escribe el desglose como una línea JSON (para agregarlo desde los logs) y lo retorna"""
+    breakdown = timings.to_dict()
+    record = {
+        "event": "export_timings",
+        "timestamp": datetime.utcnow().isoformat() + 'Z',
+        "operation": timings.operation,
+        **timings.fields,
+        **fields,
+        **breakdown,
+    }
+    print(json.dumps(record, default=str), flush=True)
+    return breakdown
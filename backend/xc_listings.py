@@ -0,0 +1,114 @@
+# xc_listings.py
+"""
+Listados de namespaces y load balancers de F5 XC con caché por tenant.
+
+Los desplegables del frontend piden estos listados en cada cambio de tenant o
+namespace, y cambian muy poco. Cada listado se guarda en memoria:
+
+- Durante LISTING_TTL_SECONDS se sirve directamente de la caché.
+- Hasta LISTING_STALE_SECONDS se sirve el valor anterior y se refresca en
+  segundo plano (stale-while-revalidate).
+- Después, o si no hay valor, la petición espera a XC.
+
+Las peticiones simultáneas por el mismo listado comparten una sola llamada a XC
+(single-flight). Cada valor lleva un ETag derivado de su contenido para que el
+navegador pueda revalidar con If-None-Match y recibir 304.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from http_clients import xc_client_lease
+
+LISTING_TTL_SECONDS = 300        # Valor fresco: se sirve sin llamar a XC
+LISTING_STALE_SECONDS = 3600     # Valor viejo: se sirve y se refresca en segundo plano
+
+# clave -> {"value", "etag", "fetched_at"}
+_entries: Dict[Tuple, dict] = {}
+_inflight: Dict[Tuple, asyncio.Task] = {}
+_generation: Dict[str, int] = {}  # Se incrementa al invalidar un tenant
+
+def listing_etag(value) -> str:
+    digest = hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True si la cabecera If-None-Match del navegador incluye `etag`"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def invalidate_listings(tenant: str):
+    """Descarta los listados del tenant (p. ej. al cambiar o borrar su token)"""
+    _generation[tenant] = _generation.get(tenant, 0) + 1
+    for key in [key for key in _entries if key[1] == tenant]:
+        del _entries[key]
+
+async def _refresh(key: Tuple, loader: Callable[[], Awaitable[List[str]]]) -> dict:
+    tenant = key[1]
+    generation = _generation.get(tenant, 0)
+    value = await loader()
+    entry = {"value": value, "etag": listing_etag(value), "fetched_at": time.time()}
+    if _generation.get(tenant, 0) == generation:
+        _entries[key] = entry
+    return entry
+
+def _done(key: Tuple, task: asyncio.Task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[LISTINGS] Error al refrescar {key}: {task.exception()}")
+
+def _start_refresh(key: Tuple, loader: Callable[[], Awaitable[List[str]]]) -> asyncio.Task:
+    """Una sola llamada a XC por clave aunque la pidan varias peticiones a la vez"""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_refresh(key, loader))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _done(key, done))
+    return task
+
+async def get_listing(key: Tuple, loader: Callable[[], Awaitable[List[str]]],
+                      refresh: bool = False) -> dict:
+    """
+    Entrada {"value", "etag", "fetched_at"} de la caché según el TTL, esperando
+    a XC solo si no hay valor utilizable (o si `refresh` lo fuerza).
+    """
+    entry = _entries.get(key)
+    age = time.time() - entry["fetched_at"] if entry else None
+
+    if entry is not None and not refresh:
+        if age < LISTING_TTL_SECONDS:
+            return entry
+        if age < LISTING_STALE_SECONDS:
+            _start_refresh(key, loader)
+            return entry
+
+    # shield: si el navegador cancela, la llamada compartida sigue para los demás
+    return await asyncio.shield(_start_refresh(key, loader))
+
+def _names(data: dict) -> List[str]:
+    return sorted(item.get("name", "") for item in data.get("items") or [] if "name" in item)
+
+async def get_listing_namespaces(tenant: str, token: str, refresh: bool = False) -> dict:
+    """Namespaces del tenant (lanza httpx.HTTPStatusError si XC responde con error)"""
+    async def load():
+        async with xc_client_lease(tenant, token) as client:
+            response = await client.get("/api/web/namespaces")
+        response.raise_for_status()
+        return _names(response.json())
+
+    return await get_listing(("namespaces", tenant), load, refresh)
+
+async def get_listing_loadbalancers(tenant: str, token: str, namespace: str, refresh: bool = False) -> dict:
+    """HTTP load balancers del namespace (lanza httpx.HTTPStatusError si XC responde con error)"""
+    async def load():
+        async with xc_client_lease(tenant, token) as client:
+            response = await client.get(f"/api/config/namespaces/{namespace}/http_loadbalancers")
+        response.raise_for_status()
+        return _names(response.json())
+
+    return await get_listing(("loadbalancers", tenant, namespace), load, refresh)
@@ -2,6 +2,9 @@ const API_URL = 'http://192.168.0.219:8000';
 let selectedHours = 24;
 let lastTenant = '';
 
+// Listados ya recibidos (URL -> {etag, data}) para revalidar con If-None-Match
+const listadosCache = {};
+
 // Mapeo de tipos de log a índices de Elasticsearch
 const ELK_INDICES = {
   'access': 'f5xc-access-logs',
@@ -339,11 +342,15 @@ function limpiarFormulario() {
   lbSelect.innerHTML = '<option value="">Primero selecciona un namespace</option>';
   lbSelect.disabled = true;
   
-  // Resetear botón de diagnóstico
+  // Resetear botones de diagnóstico y resumen
   const btnDiagnostico = document.getElementById('btnDiagnostico');
   if (btnDiagnostico) {
     btnDiagnostico.disabled = true;
   }
+  const btnResumen = document.getElementById('btnResumen');
+  if (btnResumen) {
+    btnResumen.disabled = true;
+  }
   
   document.querySelectorAll('.btn-range').forEach(function(btn) {
     btn.classList.remove('active');
@@ -358,6 +365,117 @@ function limpiarFormulario() {
   actualizarIndiceELK();
 }
 
+// ==========================================
+// TRABAJOS EN SEGUNDO PLANO
+// ==========================================
+const JOB_POLL_MS = 1000;
+let currentJobId = null;
+
+/**
+ * Crea un trabajo en el backend y sigue su avance hasta que termina (por SSE,
+ * o consultando el estado si el navegador o un proxy no lo permiten).
+ * Retorna { ok, data } con el resultado del trabajo (o con el error en data.detail).
+ */
+async function ejecutarTrabajo(body, titulo) {
+  const response = await fetch(API_URL + '/api/jobs', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+  const created = await response.json();
+  if (!response.ok) {
+    return { ok: false, data: created };
+  }
+
+  currentJobId = created.job_id;
+  try {
+    const finished = await seguirTrabajoSSE(created.job_id, titulo);
+    if (finished) {
+      return resultadoTrabajo(finished);
+    }
+    while (true) {
+      const res = await fetch(API_URL + '/api/jobs/' + created.job_id);
+      const job = await res.json();
+      if (!res.ok) {
+        return { ok: false, data: job };
+      }
+      if (job.status !== 'queued' && job.status !== 'running') {
+        return resultadoTrabajo(job);
+      }
+      mostrarProgresoTrabajo(job, titulo);
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_MS));
+    }
+  } finally {
+    currentJobId = null;
+  }
+}
+
+/**
+ * Sigue el avance de un trabajo con Server-Sent Events. Resuelve con el estado
+ * final del trabajo, o con null si la conexión SSE falla antes de terminar.
+ */
+function seguirTrabajoSSE(jobId, titulo) {
+  return new Promise(resolve => {
+    if (typeof EventSource === 'undefined') {
+      resolve(null);
+      return;
+    }
+    const source = new EventSource(API_URL + '/api/jobs/' + jobId + '/events');
+    source.addEventListener('progress', event => {
+      mostrarProgresoTrabajo(JSON.parse(event.data), titulo);
+    });
+    source.addEventListener('done', event => {
+      source.close();
+      resolve(JSON.parse(event.data));
+    });
+    source.onerror = () => {
+      source.close();
+      resolve(null);
+    };
+  });
+}
+
+function resultadoTrabajo(job) {
+  if (job.status === 'completed') {
+    return { ok: true, data: job.result };
+  }
+  if (job.status === 'cancelled') {
+    return { ok: false, data: { message: 'Trabajo cancelado' } };
+  }
+  return { ok: false, data: { detail: job.error } };
+}
+
+/**
+ * Muestra el avance de un trabajo en curso
+ */
+function mostrarProgresoTrabajo(job, titulo) {
+  const p = job.progress;
+  let html = '<div class="text-center">';
+  html += '<div class="spinner-border text-primary" role="status"><span class="visually-hidden">Cargando...</span></div>';
+  html += '<p class="mt-2 mb-1">' + titulo + (job.status === 'queued' ? ' (en cola)' : '') + '</p>';
+  html += '<small class="text-muted">' + p.pages.toLocaleString() + ' páginas · ' + p.documents_fetched.toLocaleString() + ' descargados';
+  if (job.kind === 'elk') {
+    html += ' · ' + p.documents_indexed.toLocaleString() + ' indexados (' + p.batches_acked + ' lotes)';
+  }
+  const ritmo = p.current_fetch_docs_per_second !== undefined ? p.current_fetch_docs_per_second : p.fetch_docs_per_second;
+  html += ' · ' + ritmo.toLocaleString() + ' docs/s · ' + p.elapsed_seconds + 's</small>';
+  html += '<div class="mt-2"><button type="button" class="btn btn-sm btn-outline-danger" onclick="cancelarTrabajo()">Cancelar</button></div>';
+  html += '</div>';
+  mostrarResultado(html, 'info');
+}
+
+/**
+ * Cancela el trabajo en curso
+ */
+async function cancelarTrabajo() {
+  if (!currentJobId) return;
+  try {
+    await fetch(API_URL + '/api/jobs/' + currentJobId, { method: 'DELETE' });
+  } catch (error) {
+    console.error('Error cancelando trabajo:', error);
+  }
+}
+
 /**
  * Muestra un mensaje de resultado al usuario
  */
@@ -372,6 +490,28 @@ function mostrarResultado(mensaje, tipo) {
 // CARGA DINÁMICA DE DATOS
 // ==========================================
 
+/**
+ * GET de un listado (namespaces, load balancers) revalidando con ETag:
+ * si el backend responde 304 se reutiliza la copia local.
+ * Retorna {ok, data} como response.ok / response.json().
+ */
+async function fetchListado(url) {
+  const cached = listadosCache[url];
+  const headers = cached ? { 'If-None-Match': cached.etag } : {};
+  const response = await fetch(url, { headers: headers });
+
+  if (response.status === 304 && cached) {
+    return { ok: true, data: cached.data };
+  }
+
+  const data = await response.json();
+  const etag = response.headers.get('ETag');
+  if (response.ok && etag) {
+    listadosCache[url] = { etag: etag, data: data };
+  }
+  return { ok: response.ok, data: data };
+}
+
 /**
  * Carga los namespaces disponibles para un tenant
  */
@@ -395,8 +535,8 @@ async function cargarNamespaces() {
   if (loadingSpinner) loadingSpinner.style.display = 'inline-block';
 
   try {
-    const response = await fetch(API_URL + '/api/namespaces/' + tenant);
-    const data = await response.json();
+    const response = await fetchListado(API_URL + '/api/namespaces/' + tenant);
+    const data = response.data;
 
     if (response.ok) {
       namespaceSelect.innerHTML = '<option value="">Selecciona un namespace</option>';
@@ -450,8 +590,8 @@ async function cargarLoadBalancers() {
   if (loadingSpinner) loadingSpinner.style.display = 'inline-block';
 
   try {
-    const response = await fetch(API_URL + '/api/loadbalancers/' + tenant + '/' + namespace);
-    const data = await response.json();
+    const response = await fetchListado(API_URL + '/api/loadbalancers/' + tenant + '/' + namespace);
+    const data = response.data;
 
     if (response.ok) {
       lbSelect.innerHTML = '<option value="">Selecciona un load balancer</option>';
@@ -489,6 +629,7 @@ function actualizarCamposSegunTipoLog() {
   const lbContainer = lbSelect.closest('.col-md-4');
   const lbLabel = lbContainer ? lbContainer.querySelector('label') : null;
   const btnDiagnostico = document.getElementById('btnDiagnostico');
+  const btnResumen = document.getElementById('btnResumen');
   
   actualizarIndiceELK();
   
@@ -503,6 +644,9 @@ function actualizarCamposSegunTipoLog() {
     if (btnDiagnostico) {
       btnDiagnostico.style.display = 'none';
     }
+    if (btnResumen) {
+      btnResumen.style.display = 'none';
+    }
   } else {
     const namespace = document.getElementById('namespace').value;
     lbSelect.required = true;
@@ -512,6 +656,9 @@ function actualizarCamposSegunTipoLog() {
     if (btnDiagnostico) {
       btnDiagnostico.style.display = 'inline-block';
     }
+    if (btnResumen) {
+      btnResumen.style.display = 'inline-block';
+    }
     
     if (namespace) {
       lbSelect.disabled = false;
@@ -553,11 +700,14 @@ async function diagnosticarLB() {
       html += '<h5>🔍 Diagnóstico: ' + loadbalancer + '</h5>';
       html += '<p><strong>Estado:</strong> ' + (data.status === 'working' ? '✅ Funcional' : '⚠️ Sin logs') + '</p>';
       html += '<p><strong>Recomendación:</strong> ' + data.recommendation + '</p>';
-      html += '<hr><h6>Pruebas Realizadas:</h6><ul class="text-start">';
+      if (data.query) {
+        html += '<p><strong>Query usada en las descargas:</strong> <code>' + data.query + '</code></p>';
+      }
+      html += '<hr><h6>Pruebas Realizadas (' + data.took_ms + ' ms):</h6><ul class="text-start">';
 
       if (data.tests && data.tests.length > 0) {
         data.tests.forEach(function(test) {
-          const icon = test.status === 'pass' ? '✅' : (test.logs_found > 0 ? '✅' : '❌');
+          const icon = test.status === 'skipped' ? '⏭️' : (test.status === 'pass' || test.logs_found > 0 ? '✅' : '❌');
           html += '<li>' + icon + ' <strong>' + test.name + ':</strong> ';
           if (test.logs_found !== undefined) {
             html += test.logs_found + ' logs encontrados';
@@ -578,6 +728,162 @@ async function diagnosticarLB() {
   }
 }
 
+/**
+ * Desglose de tiempos por etapa de una exportación (campo `timings` de la respuesta).
+ * Las etapas suman el tiempo de todos los workers, por eso pueden superar el total.
+ */
+function desgloseTiempos(timings) {
+  if (!timings) return '';
+  const etapas = {
+    network_wait: 'Espera XC',
+    json_parse: 'Parseo JSON',
+    dataframe_build: 'DataFrame',
+    enrichment: 'Enriquecimiento',
+    serialization: 'Serialización',
+    bulk_wait: 'Espera Bulk'
+  };
+  const partes = Object.keys(etapas)
+    .filter(function(etapa) { return timings.stages_seconds[etapa] > 0; })
+    .map(function(etapa) { return etapas[etapa] + ' ' + timings.stages_seconds[etapa] + 's'; });
+  let html = '<details class="mt-1"><summary><small class="text-muted">Desglose de tiempos (' + timings.total_seconds + 's)</small></summary>';
+  html += '<small class="text-muted">' + (partes.join(' · ') || 'Sin etapas medidas') + '<br>';
+  html += timings.pages + ' páginas, ' + timings.xc_requests + ' peticiones a XC, ' + (timings.bytes_received / 1048576).toFixed(1) + ' MB recibidos';
+  if (timings.cached_hours) html += ', ' + timings.cached_hours + ' horas desde caché';
+  if (timings.bulk_batches) html += ', ' + timings.bulk_batches + ' lotes Bulk (' + (timings.bytes_sent / 1048576).toFixed(1) + ' MB)';
+  html += '</small></details>';
+  return html;
+}
+
+/**
+ * Muestra un resumen de la ventana (top de valores por campo e histograma)
+ * calculado por XC, sin descargar los eventos
+ */
+async function mostrarResumen() {
+  const tenant = document.getElementById('tenant').value.trim();
+  const namespace = document.getElementById('namespace').value;
+  const loadbalancer = document.getElementById('loadbalancer').value;
+  const logType = document.getElementById('logType').value;
+  const customHours = document.getElementById('customHours').value;
+  const hours = customHours || selectedHours;
+
+  if (!tenant || !namespace || !loadbalancer) {
+    mostrarResultado('Completa todos los campos antes de pedir el resumen', 'warning');
+    return;
+  }
+  if (logType === 'audit') {
+    mostrarResultado('El resumen solo está disponible para Access Logs y Security Events', 'warning');
+    return;
+  }
+
+  mostrarResultado('<div class="spinner-border text-primary" role="status"><span class="visually-hidden">Cargando...</span></div><p class="mt-2">Calculando resumen...</p>', 'info');
+
+  try {
+    const url = API_URL + '/api/aggregations?log_type=' + logType + '&tenant=' + tenant + '&namespace=' + namespace +
+      '&loadbalancer=' + loadbalancer + '&hours=' + hours + filtrosQueryString(obtenerFiltros());
+    const response = await fetch(url);
+    const data = await response.json();
+
+    if (!response.ok) {
+      mostrarResultado('<strong>Error:</strong> ' + (data.detail?.error || data.detail || 'Error desconocido'), 'danger');
+      return;
+    }
+
+    let html = '<div class="alert alert-light border text-start">';
+    html += '<h5>📊 Resumen: ' + escaparHtml(loadbalancer) + ' (' + escaparHtml(hours) + 'h)</h5>';
+    html += '<p class="mb-2"><strong>Eventos:</strong> ' + (data.total_hits !== null ? data.total_hits.toLocaleString() : 'N/A');
+    html += ' <small class="text-muted">(' + data.took_ms + 'ms' + (data.cached ? ', en caché' : '') + ')</small></p>';
+    html += graficoHistograma(data.histogram, data.step);
+    html += '<div class="row">';
+    Object.keys(data.terms).forEach(function(field) {
+      html += '<div class="col-md-4">' + graficoBarras(field, data.terms[field]) + '</div>';
+    });
+    html += '</div></div>';
+    document.getElementById('resultado').innerHTML = html;
+  } catch (error) {
+    mostrarResultado('Error de conexión: ' + error.message, 'danger');
+  }
+}
+
+/**
+ * Escapa un valor para insertarlo en HTML (texto o atributo entre comillas)
+ */
+function escaparHtml(valor) {
+  return String(valor)
+    .replace(/&/g, '&amp;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;')
+    .replace(/"/g, '&quot;')
+    .replace(/'/g, '&#39;');
+}
+
+/**
+ * Barras horizontales con el top de valores de un campo
+ */
+function graficoBarras(field, buckets) {
+  let html = '<h6 class="mt-3">' + escaparHtml(field) + '</h6>';
+  if (!buckets.length) {
+    return html + '<p class="text-muted small">Sin datos</p>';
+  }
+  const max = Math.max.apply(null, buckets.map(function(b) { return b.count; })) || 1;
+  buckets.forEach(function(bucket) {
+    html += '<div class="agg-bar-row"><span class="agg-bar-label" title="' + escaparHtml(bucket.key) + '">' +
+      escaparHtml(bucket.key || '(vacío)') + '</span>';
+    html += '<div class="progress flex-grow-1"><div class="progress-bar" style="width:' + (100 * bucket.count / max) + '%"></div></div>';
+    html += '<span class="agg-bar-count">' + bucket.count.toLocaleString() + '</span></div>';
+  });
+  return html;
+}
+
+/**
+ * Histograma de eventos por fecha (columnas verticales)
+ */
+function graficoHistograma(buckets, step) {
+  if (!buckets.length) {
+    return '';
+  }
+  const max = Math.max.apply(null, buckets.map(function(b) { return b.count; })) || 1;
+  let html = '<h6>Eventos por ' + escaparHtml(step) + '</h6><div class="agg-histogram">';
+  buckets.forEach(function(bucket) {
+    html += '<div class="agg-histogram-bar" style="height:' + Math.max(1, 100 * bucket.count / max) + '%" title="' +
+      escaparHtml(new Date(bucket.time).toLocaleString() + ': ' + bucket.count.toLocaleString()) + '"></div>';
+  });
+  html += '</div>';
+  html += '<div class="d-flex justify-content-between small text-muted"><span>' +
+    escaparHtml(new Date(buckets[0].time).toLocaleString()) + '</span><span>' +
+    escaparHtml(new Date(buckets[buckets.length - 1].time).toLocaleString()) + '</span></div>';
+  return html;
+}
+
+/**
+ * Filtros del formulario con valor (se aplican en la query de XC)
+ */
+function obtenerFiltros() {
+  const campos = {
+    rsp_code_class: 'filterRspCodeClass',
+    src_ip: 'filterSrcIp',
+    path_prefix: 'filterPathPrefix',
+    country: 'filterCountry',
+    method: 'filterMethod'
+  };
+  const filtros = {};
+  Object.keys(campos).forEach(function(nombre) {
+    const valor = document.getElementById(campos[nombre]).value.trim();
+    if (valor) {
+      filtros[nombre] = valor;
+    }
+  });
+  return filtros;
+}
+
+/**
+ * Filtros como parámetros de URL (&nombre=valor...)
+ */
+function filtrosQueryString(filtros) {
+  return Object.keys(filtros).map(function(nombre) {
+    return '&' + nombre + '=' + encodeURIComponent(filtros[nombre]);
+  }).join('');
+}
+
 /**
  * Consulta los logs según los parámetros del formulario (genera CSV)
  */
@@ -599,31 +905,49 @@ async function consultarLogs() {
     return;
   }
 
-  mostrarResultado('<div class="spinner-border text-primary" role="status"><span class="visually-hidden">Cargando...</span></div><p class="mt-2">Consultando logs, por favor espera...</p>', 'info');
+  const format = document.getElementById('exportFormat').value;
 
-  try {
-    let url = API_URL + '/api/logs?log_type=' + logType + '&tenant=' + tenant + '&namespace=' + namespace + '&hours=' + hours;
-    
-    if (logType !== 'audit') {
-      url += '&loadbalancer=' + loadbalancer;
+  if (document.getElementById('csvStreaming').checked) {
+    if (format !== 'csv' && format !== 'csv.gz') {
+      mostrarResultado('La descarga directa (streaming) solo admite CSV o CSV comprimido', 'warning');
+      return;
     }
+    descargarCSVStreaming(logType, tenant, namespace, loadbalancer, hours, format === 'csv.gz');
+    return;
+  }
 
-    const response = await fetch(url);
-    const data = await response.json();
+  mostrarResultado('<div class="spinner-border text-primary" role="status"><span class="visually-hidden">Cargando...</span></div><p class="mt-2">Consultando logs, por favor espera...</p>', 'info');
 
-    if (response.ok) {
+  try {
+    const { ok, data } = await ejecutarTrabajo({
+      kind: 'csv',
+      log_type: logType,
+      tenant: tenant,
+      namespace: namespace,
+      loadbalancer: logType !== 'audit' ? loadbalancer : null,
+      hours: parseInt(hours),
+      format: format,
+      filters: obtenerFiltros()
+    }, 'Consultando logs');
+
+    if (ok) {
       const downloadUrl = API_URL + '/api/download?file=' + data.file;
       let html = '<div class="alert alert-success">';
       html += '<h5>✅ Logs generados exitosamente</h5>';
       html += '<p><strong>Tipo:</strong> ' + data.log_type + '</p>';
       html += '<p><strong>Archivo:</strong> ' + data.file + '</p>';
+      html += '<p><strong>Formato:</strong> ' + (data.format || 'csv') + '</p>';
       html += '<p><strong>Registros:</strong> ' + (data.records ? data.records.toLocaleString() : 'N/A') + '</p>';
+      if (data.truncated_events) {
+        html += '<p class="text-warning"><strong>⚠️ XC reportó ' + data.truncated_events.toLocaleString() + ' eventos más de los recibidos: el archivo está incompleto</strong></p>';
+      }
       html += '<p><strong>Tiempo:</strong> ' + (data.total_time_seconds || 'N/A') + 's</p>';
-      html += '<a href="' + downloadUrl + '" class="btn btn-primary mt-2" download><i class="bi bi-download"></i> Descargar CSV</a>';
+      html += desgloseTiempos(data.timings);
+      html += '<a href="' + downloadUrl + '" class="btn btn-primary mt-2" download><i class="bi bi-download"></i> Descargar archivo</a>';
       html += '</div>';
       mostrarResultado(html, 'success');
     } else {
-      const errorMsg = data.detail?.error || data.detail || 'Error desconocido';
+      const errorMsg = data.message || data.detail?.error || data.detail || 'Error desconocido';
       const errorDetails = data.detail?.stderr || data.detail?.stdout || '';
       let html = '<div class="alert alert-danger"><strong>Error:</strong> ' + errorMsg;
       if (errorDetails) {
@@ -637,6 +961,30 @@ async function consultarLogs() {
   }
 }
 
+/**
+ * Descarga el CSV en streaming: el navegador recibe las filas a medida que el
+ * backend descarga las páginas de XC (sin generar el archivo en el servidor)
+ */
+function descargarCSVStreaming(logType, tenant, namespace, loadbalancer, hours, gzip) {
+  let url = API_URL + '/api/logs?stream=true&log_type=' + logType + '&tenant=' + tenant + '&namespace=' + namespace + '&hours=' + hours;
+  if (logType !== 'audit') {
+    url += '&loadbalancer=' + loadbalancer;
+  }
+  if (gzip) {
+    url += '&gzip=true';
+  }
+  url += filtrosQueryString(obtenerFiltros());
+
+  const link = document.createElement('a');
+  link.href = url;
+  link.download = '';
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+
+  mostrarResultado('<strong>Descarga iniciada.</strong> El archivo ' + (gzip ? 'CSV comprimido (.csv.gz)' : 'CSV') + ' se recibe a medida que se obtienen los logs; el navegador muestra el avance.', 'info');
+}
+
 /**
  * Envía logs directamente a Elasticsearch
  */
@@ -669,16 +1017,18 @@ async function enviarAElastic() {
   );
 
   try {
-    let url = API_URL + '/api/logs/elk?log_type=' + logType + '&tenant=' + tenant + '&namespace=' + namespace + '&hours=' + hours;
-    
-    if (logType !== 'audit') {
-      url += '&loadbalancer=' + loadbalancer;
-    }
+    const { ok, data } = await ejecutarTrabajo({
+      kind: 'elk',
+      log_type: logType,
+      tenant: tenant,
+      namespace: namespace,
+      loadbalancer: logType !== 'audit' ? loadbalancer : null,
+      hours: parseInt(hours),
+      incremental: document.getElementById('elkIncremental').checked,
+      filters: obtenerFiltros()
+    }, 'Enviando logs a Elasticsearch <small class="text-muted">(' + indexName + ')</small>');
 
-    const response = await fetch(url, { method: 'POST' });
-    const data = await response.json();
-
-    if (response.ok && data.success) {
+    if (ok && data.success) {
       let html = '<div class="alert alert-success">';
       html += '<h5>✅ Logs enviados a Elasticsearch</h5>';
       html += '<div class="row text-center mt-3">';
@@ -696,6 +1046,19 @@ async function enviarAElastic() {
       if (data.took_ms) {
         html += '<p class="mb-0"><small class="text-muted">Elasticsearch took: ' + data.took_ms + 'ms</small></p>';
       }
+      if (data.duplicates) {
+        html += '<p class="mb-0"><small class="text-muted">Ya existían en el índice (no duplicados): ' + data.duplicates.toLocaleString() + '</small></p>';
+      }
+      if (data.incremental) {
+        html += '<p class="mb-0"><small class="text-muted">Incremental desde ' + new Date(data.window_start * 1000).toLocaleString() + (data.watermark ? ' (próximo envío desde ' + new Date(data.watermark * 1000).toLocaleString() + ')' : '') + '</small></p>';
+      }
+      if (data.truncated_events) {
+        html += '<p class="mb-0 text-warning"><strong>⚠️ XC reportó ' + data.truncated_events.toLocaleString() + ' eventos más de los recibidos (envío incompleto' + (data.incremental ? ', el watermark no avanzó' : '') + ')</strong></p>';
+      }
+      if (data.throughput) {
+        html += '<p class="mb-0"><small class="text-muted">Throughput: ' + data.throughput.docs_per_second + ' docs/s, ' + data.throughput.mb_per_second + ' MB/s (' + data.throughput.batches + ' lotes, ' + data.throughput.retries + ' reintentos)</small></p>';
+      }
+      html += desgloseTiempos(data.timings);
       html += '</div>';
       mostrarResultado(html, 'success');
     } else {
@@ -737,7 +1100,7 @@ document.addEventListener('DOMContentLoaded', function() {
     logTypeSelect.addEventListener('change', actualizarCamposSegunTipoLog);
   }
   
-  // Listener para habilitar botón de diagnóstico cuando se seleccione un LB
+  // Listener para habilitar los botones de diagnóstico y resumen cuando se seleccione un LB
   var lbSelect = document.getElementById('loadbalancer');
   if (lbSelect) {
     lbSelect.addEventListener('change', function() {
@@ -745,6 +1108,10 @@ document.addEventListener('DOMContentLoaded', function() {
       if (btnDiagnostico) {
         btnDiagnostico.disabled = !this.value;
       }
+      var btnResumen = document.getElementById('btnResumen');
+      if (btnResumen) {
+        btnResumen.disabled = !this.value;
+      }
     });
   }
 });